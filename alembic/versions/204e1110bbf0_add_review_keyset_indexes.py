@@ -0,0 +1,47 @@
+"""add review keyset indexes
+
+Revision ID: 204e1110bbf0
+Revises: e5a8c3f17d29
+Create Date: 2025-07-10 11:24:07.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '204e1110bbf0'
+down_revision: Union[str, None] = 'e5a8c3f17d29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индексы строятся без блокировки записи в reviews, CONCURRENTLY нельзя выполнять в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_reviews_top_level_created_at_id',
+            'reviews',
+            [sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_where=sa.text('parent_id IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_reviews_top_level_user_id_created_at_id',
+            'reviews',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_where=sa.text('parent_id IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reviews_top_level_user_id_created_at_id', table_name='reviews', postgresql_concurrently=True)
+        op.drop_index('ix_reviews_top_level_created_at_id', table_name='reviews', postgresql_concurrently=True)
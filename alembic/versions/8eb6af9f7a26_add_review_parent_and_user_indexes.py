@@ -0,0 +1,46 @@
+"""add review parent and user indexes
+
+Revision ID: 8eb6af9f7a26
+Revises: 204e1110bbf0
+Create Date: 2025-07-11 16:02:44.913850
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8eb6af9f7a26'
+down_revision: Union[str, None] = '204e1110bbf0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индексы строятся без блокировки записи в reviews, CONCURRENTLY нельзя выполнять в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_reviews_replies_parent_id_created_at_id',
+            'reviews',
+            ['parent_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_where=sa.text('parent_id IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_reviews_user_id',
+            'reviews',
+            ['user_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reviews_user_id', table_name='reviews', postgresql_concurrently=True)
+        op.drop_index('ix_reviews_replies_parent_id_created_at_id', table_name='reviews', postgresql_concurrently=True)
@@ -0,0 +1,131 @@
+"""Пропускная способность расчета: отдельные запросы против /calculate/batch, в расчетах в секунду.
+
+    python -m scripts.bench.batch_quotes [--requests 200] [--cities 20] [--lookup-latency 0.02] [--calculate-latency 0.05]
+
+Службы доставки заменяются поставщиком, который ищет город за --lookup-latency секунд
+(холодный кэш городов) и считает тариф за --calculate-latency секунд.
+single — quote_delivery для каждой заявки, не больше BATCH_CONCURRENCY одновременно,
+         как клиент с BATCH_CONCURRENCY параллельными запросами /calculate;
+batch  — один POST /api/v1/public/calculate/batch со всеми заявками через ASGI-приложение.
+Заявки каждого прогона различаются весом посылки, поэтому кэш расчетов не срабатывает.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+
+from src.calculator.providers import CarrierProvider, carrier_registry
+from src.calculator.schemas import DeliveryRequest, DeliveryResult
+from src.calculator.router import BATCH_CONCURRENCY, BATCH_MAX_ITEMS, calculator_router, quote_delivery
+
+
+class SlowProvider(CarrierProvider):
+    name = 'bench'
+    title = 'Тестовая служба'
+
+    def __init__(self, lookup_latency: float, calculate_latency: float):
+        self.lookup_latency = lookup_latency
+        self.calculate_latency = calculate_latency
+        self.lookups = 0
+
+    async def get_city_code(self, city_name: str) -> str:
+        self.lookups += 1
+        await asyncio.sleep(self.lookup_latency)
+        return city_name.lower()
+
+    async def calculate(self, request, codes, shipment_date):
+        await asyncio.sleep(self.calculate_latency)
+        return [
+            DeliveryResult(
+                service_name=self.title,
+                delivery_sum=1000,
+                period_min=1,
+                period_max=3,
+                service_url='',
+                service_logo='',
+            )
+        ]
+
+
+def make_requests(routes: list[tuple[str, str]], weight: int) -> list[DeliveryRequest]:
+    shipment_date = datetime.now() + timedelta(days=7)
+    return [
+        DeliveryRequest(
+            service=SlowProvider.name,
+            from_location={'city_name': from_city},
+            to_location={'city_name': to_city},
+            packages=[{'weight': weight + index, 'length': 10, 'width': 10, 'height': 10}],
+            date=shipment_date,
+        )
+        for index, (from_city, to_city) in enumerate(routes)
+    ]
+
+async def run_single(requests: list[DeliveryRequest]) -> tuple[float, int]:
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def quote(request: DeliveryRequest) -> None:
+        async with semaphore:
+            await quote_delivery(request)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(quote(request) for request in requests))
+    return time.perf_counter() - started, len(requests)
+
+async def run_batch(client: httpx.AsyncClient, requests: list[DeliveryRequest]) -> tuple[float, int]:
+    payload = [request.model_dump(mode='json') for request in requests]
+
+    started = time.perf_counter()
+    response = await client.post('/api/v1/public/calculate/batch', json=payload)
+    elapsed = time.perf_counter() - started
+
+    response.raise_for_status()
+    frames = [json.loads(line) for line in response.text.splitlines() if line]
+    return elapsed, sum(frame['status'] == 'ok' for frame in frames)
+
+async def main(requests: int, cities: int, lookup_latency: float, calculate_latency: float) -> None:
+    if requests > BATCH_MAX_ITEMS:
+        raise SystemExit(f'--requests больше BATCH_MAX_ITEMS={BATCH_MAX_ITEMS}')
+
+    provider = SlowProvider(lookup_latency, calculate_latency)
+    carrier_registry.register(provider)
+
+    app = FastAPI()
+    app.include_router(calculator_router)
+    transport = httpx.ASGITransport(app=app)
+
+    rng = random.Random(0)
+    names = [f'Город {i}' for i in range(cities)]
+    routes = [tuple(rng.sample(names, 2)) for _ in range(requests)]
+
+    print(
+        f'{requests} заявок, {cities} городов, поиск города {lookup_latency * 1000:.0f} мс, '
+        f'расчет {calculate_latency * 1000:.0f} мс, BATCH_CONCURRENCY={BATCH_CONCURRENCY}'
+    )
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        runs = (
+            ('single', lambda batch: run_single(batch)),
+            ('batch', lambda batch: run_batch(client, batch)),
+        )
+        for run_index, (name, run) in enumerate(runs):
+            provider.lookups = 0
+            batch = make_requests(routes, weight=1 + run_index * requests)
+            elapsed, quoted = await run(batch)
+            print(
+                f'{name:>6}: {elapsed * 1000:.0f} мс, {quoted / elapsed:.1f} расчетов/с, '
+                f'рассчитано {quoted}, поисков в службе {provider.lookups}'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пропускная способность пакетного расчета')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--lookup-latency', type=float, default=0.02)
+    parser.add_argument('--calculate-latency', type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.cities, args.lookup_latency, args.calculate_latency))
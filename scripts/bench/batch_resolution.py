@@ -0,0 +1,70 @@
+"""Определение кодов городов в пакетном расчете: по заявкам против BatchCityResolver.
+
+    python -m scripts.bench.batch_resolution [--requests 200] [--cities 20] [--latency 0.02]
+
+Служба доставки заменяется поставщиком, который отвечает через --latency секунд, —
+так выглядит холодный кэш городов, когда каждый поиск идет в API службы.
+per-request — resolve_carrier_city_codes для каждой заявки, как отдельные запросы /calculate;
+batch       — общий BatchCityResolver на пакет, как в /calculate/batch.
+Одновременно обрабатывается не больше BATCH_CONCURRENCY заявок.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from src.calculator.providers import CarrierProvider, carrier_registry
+from src.calculator.resolution import BatchCityResolver, resolve_carrier_city_codes
+from src.calculator.router import BATCH_CONCURRENCY
+
+
+class SlowProvider(CarrierProvider):
+    name = 'bench'
+    title = 'Тестовая служба'
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lookups = 0
+
+    async def get_city_code(self, city_name: str) -> str:
+        self.lookups += 1
+        await asyncio.sleep(self.latency)
+        return city_name.lower()
+
+    async def calculate(self, request, codes, shipment_date):
+        return []
+
+
+async def run(resolve, routes: list[tuple[str, str]]) -> float:
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def resolve_route(from_city: str, to_city: str) -> None:
+        async with semaphore:
+            await resolve(SlowProvider.name, from_city, to_city)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(resolve_route(*route) for route in routes))
+    return time.perf_counter() - started
+
+async def main(requests: int, cities: int, latency: float) -> None:
+    provider = SlowProvider(latency)
+    carrier_registry.register(provider)
+
+    rng = random.Random(0)
+    names = [f'Город {i}' for i in range(cities)]
+    routes = [tuple(rng.sample(names, 2)) for _ in range(requests)]
+
+    print(f'{requests} заявок, {cities} городов, задержка поиска {latency * 1000:.0f} мс, BATCH_CONCURRENCY={BATCH_CONCURRENCY}')
+    for name, make_resolver in (('per-request', lambda: resolve_carrier_city_codes), ('batch', BatchCityResolver)):
+        provider.lookups = 0
+        elapsed = await run(make_resolver(), routes)
+        print(f'{name:>11}: {elapsed * 1000:.0f} мс, поисков в службе {provider.lookups}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Определение кодов городов в пакетном расчете')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.cities, args.latency))
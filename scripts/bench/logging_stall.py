@@ -0,0 +1,109 @@
+"""Остановки цикла событий из-за логирования под нагрузкой расчетов.
+
+    python -m scripts.bench.logging_stall [--quotes 500] [--runs 3]
+
+Каждый режим запускается в отдельном процессе, логи пишутся во временный каталог,
+консольный вывод отбрасывается:
+  sync  — прежняя схема: RotatingFileHandler и StreamHandler прямо на логгере,
+          сообщения с дампами собираются f-строкой в цикле событий;
+  queue — src.logger: очередь, QueueListener и ленивое форматирование.
+Пробник засыпает на 1 мс и замеряет, насколько позже он просыпается.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+
+PAYLOAD_DATA = {
+    'cities': [
+        {'code': str(i), 'name': f'Город {i}', 'terminals': list(range(20))}
+        for i in range(60)
+    ]
+}
+DUMPS_PER_QUOTE = 6
+
+
+def sync_logger(name: str, log_dir: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = RotatingFileHandler(os.path.join(log_dir, 'app.log'), maxBytes=10*1024*1024, backupCount=5, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    return logger
+
+async def probe(stop: asyncio.Event, stalls: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - started - 0.001)
+
+async def run_load(mode: str, quotes: int, log_dir: str) -> tuple[float, float, float]:
+    if mode == 'sync':
+        logger = sync_logger('bench', log_dir)
+        log_dump = lambda: logger.info(f"Ответ расчета стоимости: {PAYLOAD_DATA}")
+    else:
+        from src.logger import setup_logger, PAYLOAD
+        logger = setup_logger('bench')
+        log_dump = lambda: logger.info("Ответ расчета стоимости: %s", PAYLOAD_DATA, extra=PAYLOAD)
+
+    async def quote() -> None:
+        for _ in range(DUMPS_PER_QUOTE):
+            await asyncio.sleep(0)
+            log_dump()
+
+    stop = asyncio.Event()
+    stalls: list[float] = []
+    probe_task = asyncio.create_task(probe(stop, stalls))
+    started = time.perf_counter()
+    await asyncio.gather(*(quote() for _ in range(quotes)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    stalls.sort()
+    return elapsed, stalls[-1], stalls[int(len(stalls) * 0.99)]
+
+def child(mode: str, quotes: int) -> None:
+    elapsed, max_stall, p99 = asyncio.run(run_load(mode, quotes, os.environ['LOG_DIR']))
+    # stdout отдается родителю, консольный лог идет в stderr
+    print(f'{elapsed * 1000:.0f} {max_stall * 1000:.1f} {p99 * 1000:.1f}', flush=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Остановки цикла событий при логировании дампов')
+    parser.add_argument('--quotes', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--child', choices=['sync', 'queue'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.quotes)
+        return
+
+    print(f'{args.quotes} расчетов по {DUMPS_PER_QUOTE} дампов ~5 КБ')
+    for mode in ('sync', 'queue'):
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as log_dir:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'scripts.bench.logging_stall', '--child', mode, '--quotes', str(args.quotes)],
+                    env={**os.environ, 'LOG_DIR': log_dir},
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    check=True,
+                ).stdout.split()
+            elapsed, max_stall, p99 = output
+            print(f'{mode:>5}: нагрузка {elapsed} мс, максимальная остановка {max_stall} мс, p99 {p99} мс')
+
+
+if __name__ == '__main__':
+    main()
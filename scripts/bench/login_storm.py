@@ -0,0 +1,69 @@
+"""Задержка расчетов во время волны входов: bcrypt в цикле событий против PasswordService.
+
+    python -m scripts.bench.login_storm [--logins 40] [--quotes 200] [--rounds 12]
+
+inline — прежний обработчик входа: CryptContext.verify прямо в цикле событий;
+pool   — src.users.passwords.PasswordService: проверка в пуле потоков.
+Входы начинаются с шагом 50 мс, расчет имитируется ожиданием ответа службы 20 мс
+и запускается каждые 10 мс. Задержка расчета — время сверх этих 20 мс.
+Для passlib 1.7.4 нужен bcrypt < 4.1, версия закреплена в requirements.txt.
+"""
+import argparse
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from src.users.passwords import PasswordService, PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY
+
+
+CARRIER_LATENCY = 0.02
+LOGIN_INTERVAL = 0.05
+QUOTE_INTERVAL = 0.01
+
+
+async def run(mode: str, logins: int, quotes: int, rounds: int) -> tuple[float, float, float]:
+    context = CryptContext(schemes=['bcrypt'], bcrypt__rounds=rounds)
+    password_hash = context.hash('password')
+    service = PasswordService(rounds, PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY)
+
+    async def login(i: int) -> None:
+        await asyncio.sleep(i * LOGIN_INTERVAL)
+        if mode == 'inline':
+            context.verify('password', password_hash)
+        else:
+            await service.verify('password', password_hash)
+
+    async def quote(i: int) -> float:
+        await asyncio.sleep(i * QUOTE_INTERVAL)
+        started = time.perf_counter()
+        await asyncio.sleep(CARRIER_LATENCY)
+        return time.perf_counter() - started - CARRIER_LATENCY
+
+    try:
+        started = time.perf_counter()
+        delays, _ = await asyncio.gather(
+            asyncio.gather(*(quote(i) for i in range(quotes))),
+            asyncio.gather(*(login(i) for i in range(logins))),
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        service.shutdown()
+
+    delays = sorted(delays)
+    return elapsed, delays[len(delays) // 2], delays[int(len(delays) * 0.99)]
+
+async def main(logins: int, quotes: int, rounds: int) -> None:
+    print(f'{logins} входов (bcrypt, стоимость {rounds}), {quotes} расчетов, потоков {PASSWORD_HASH_WORKERS}')
+    for mode in ('inline', 'pool'):
+        elapsed, p50, p99 = await run(mode, logins, quotes, rounds)
+        print(f'{mode:>6}: всего {elapsed * 1000:.0f} мс, задержка расчета p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Задержка расчетов во время волны входов')
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--quotes', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=12)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.quotes, args.rounds))
@@ -0,0 +1,122 @@
+"""Постраничная выдача отзывов: OFFSET против курсора (created_at, id) на большой таблице.
+
+    DATABASE_URL=... python -m scripts.bench.review_pagination [--seed] [--rows 1000000] [--runs 5]
+
+База должна быть обновлена до последней миграции (alembic upgrade head).
+--seed заполняет пустую базу: 10 000 пользователей и --rows отзывов, из них 10% — ответы.
+offset — прежняя выдача: ORDER BY created_at DESC, id DESC OFFSET n LIMIT k;
+keyset — src.reviews.pagination.paginate_reviews с курсором на ту же позицию.
+Для каждой глубины печатается медиана времени запроса страницы.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import Select, func, select, text
+
+from src.database import engine
+from src.reviews.models import ReviewModel
+from src.reviews.pagination import encode_cursor, paginate_reviews
+
+
+SEED_USERS = 10_000
+REPLY_SHARE = 0.1
+DEPTHS = [0, 1_000, 10_000, 100_000, 500_000]
+
+
+def top_level_reviews() -> Select:
+    return select(
+        ReviewModel.id,
+        ReviewModel.user_id,
+        ReviewModel.review,
+        ReviewModel.rate,
+        ReviewModel.created_at,
+    ).where(ReviewModel.parent_id.is_(None))
+
+def offset_page(offset: int, limit: int) -> Select:
+    return (
+        top_level_reviews()
+        .order_by(ReviewModel.created_at.desc(), ReviewModel.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )
+
+async def seed(connection, rows: int) -> None:
+    if await connection.scalar(select(func.count()).select_from(ReviewModel)):
+        raise SystemExit('Таблица reviews не пуста, заполнение пропущено')
+
+    top_level = int(rows * (1 - REPLY_SHARE))
+    started = time.perf_counter()
+    await connection.execute(text(
+        "INSERT INTO users (email, username, phone, password, role, updated_at) "
+        "SELECT 'bench' || i || '@example.com', 'bench' || i, '+7' || (9000000000 + i), 'x', 'USER', now() "
+        "FROM generate_series(1, :users) AS i"
+    ), {'users': SEED_USERS})
+    user_offset = await connection.scalar(text('SELECT min(id) - 1 FROM users'))
+    # Отзывы распределены по 1500 дням, в один день попадает много отзывов — id различает их в курсоре
+    await connection.execute(text(
+        "INSERT INTO reviews (user_id, review, rate, created_at, parent_id) "
+        "SELECT :user_offset + 1 + i % :users, 'Отзыв ' || i, 1 + i % 5, current_date - (i % 1500), NULL "
+        "FROM generate_series(1, :top_level) AS i"
+    ), {'user_offset': user_offset, 'users': SEED_USERS, 'top_level': top_level})
+    review_offset = await connection.scalar(text('SELECT min(id) - 1 FROM reviews'))
+    await connection.execute(text(
+        "INSERT INTO reviews (user_id, review, rate, created_at, parent_id) "
+        "SELECT :user_offset + 1 + (i * 7) % :users, 'Ответ ' || i, 0, current_date - (i % 1500), "
+        ":review_offset + 1 + (i * 7919) % :top_level "
+        "FROM generate_series(1, :replies) AS i"
+    ), {
+        'user_offset': user_offset,
+        'users': SEED_USERS,
+        'review_offset': review_offset,
+        'top_level': top_level,
+        'replies': rows - top_level,
+    })
+    await connection.commit()
+    await connection.execute(text('ANALYZE users'))
+    await connection.execute(text('ANALYZE reviews'))
+    await connection.commit()
+    print(f'Заполнено {rows} отзывов за {time.perf_counter() - started:.1f} с')
+
+async def measure(connection, query: Select, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        (await connection.execute(query)).all()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+async def main(run_seed: bool, rows: int, limit: int, runs: int) -> None:
+    try:
+        async with engine.connect() as connection:
+            if run_seed:
+                await seed(connection, rows)
+
+            total = await connection.scalar(select(func.count()).select_from(ReviewModel).where(ReviewModel.parent_id.is_(None)))
+            print(f'Основных отзывов: {total}, страница {limit}, медиана из {runs}')
+
+            for depth in DEPTHS:
+                if depth >= total:
+                    break
+                cursor = None
+                if depth:
+                    # Курсор последнего отзыва предыдущей страницы: keyset читает ту же страницу, что и OFFSET
+                    last = (await connection.execute(offset_page(depth - 1, 0))).first()
+                    cursor = encode_cursor(last)
+
+                offset_time = await measure(connection, offset_page(depth, limit), runs)
+                keyset_time = await measure(connection, paginate_reviews(top_level_reviews(), cursor, limit), runs)
+                print(f'глубина {depth:>7}: offset {offset_time * 1000:8.2f} мс, keyset {keyset_time * 1000:6.2f} мс')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OFFSET против курсора на большой таблице отзывов')
+    parser.add_argument('--seed', action='store_true', help='Заполнить пустую базу тестовыми отзывами')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.seed, args.rows, args.limit, args.runs))
@@ -0,0 +1,77 @@
+"""Поиск терминала Деловых Линий: линейный обход справочника против TerminalIndex.
+
+    python -m scripts.bench.terminal_lookup [--lookups 2000] [--runs 3]
+
+linear — прежний get_terminal_id: обход списка городов terminals_v3.json при каждом поиске;
+index  — src.dellin.terminals.TerminalIndex: словарь по коду города, построенный один раз.
+Коды городов выбираются случайно из справочника, каждый десятый — несуществующий.
+Перед замером проверяется, что оба способа выбирают одни и те же терминалы.
+"""
+import argparse
+import random
+import time
+from typing import Callable, Optional
+
+from src.dellin.terminals import TerminalIndex, load_terminals, terminals_path
+
+
+DELIVERY_MODES = ['auto', 'express', 'avia']
+
+
+def linear_terminal_id(city_code: str, terminals_data: dict, delivery_mode: str) -> Optional[str]:
+    for city in terminals_data.get('city', []):
+        if city.get('code') == city_code:
+            for terminal in city.get('terminals', {}).get('terminal', []):
+                if not terminal.get('giveoutCargo', True):
+                    continue
+                if delivery_mode != 'express' or terminal.get('express', False):
+                    return terminal.get('id')
+            return None
+    return None
+
+def index_terminal_id(city_code: str, index: TerminalIndex, delivery_mode: str) -> Optional[str]:
+    terminal = index.get(city_code, delivery_mode)
+    return terminal['id'] if terminal is not None else None
+
+def sample_lookups(terminals_data: dict, count: int) -> list[tuple[str, str]]:
+    codes = [city.get('code') for city in terminals_data.get('city', [])]
+    rng = random.Random(0)
+    return [
+        (f'missing-{i}' if i % 10 == 0 else rng.choice(codes), rng.choice(DELIVERY_MODES))
+        for i in range(count)
+    ]
+
+def measure(lookup: Callable[[str, str], Optional[str]], lookups: list[tuple[str, str]]) -> float:
+    started = time.perf_counter()
+    for city_code, delivery_mode in lookups:
+        lookup(city_code, delivery_mode)
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Поиск терминала: линейный обход против индекса')
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    terminals_data = load_terminals(terminals_path)
+    started = time.perf_counter()
+    index = TerminalIndex.from_terminals_data(terminals_data)
+    build_time = time.perf_counter() - started
+
+    lookups = sample_lookups(terminals_data, args.lookups)
+    linear = lambda city_code, mode: linear_terminal_id(city_code, terminals_data, mode)
+    indexed = lambda city_code, mode: index_terminal_id(city_code, index, mode)
+
+    mismatches = sum(linear(*lookup) != indexed(*lookup) for lookup in lookups)
+    if mismatches:
+        raise SystemExit(f'Результаты расходятся в {mismatches} поисках из {len(lookups)}')
+
+    print(f"{len(terminals_data.get('city', []))} городов, {args.lookups} поисков, построение индекса {build_time * 1000:.1f} мс")
+    for name, lookup in (('linear', linear), ('index', indexed)):
+        for _ in range(args.runs):
+            elapsed = measure(lookup, lookups)
+            print(f'{name:>6}: {elapsed * 1000:.1f} мс, {elapsed / len(lookups) * 1e6:.2f} мкс на поиск')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Время и память подготовки справочника терминалов Деловых Линий при запуске.
+
+    python -m scripts.bench.terminal_startup [--runs 5]
+
+import   — прежний путь: разбор terminals_v3.json при импорте src.dellin.utils;
+fallback — снимка нет: проверка снимка и построение TerminalIndex из JSON;
+snapshot — проверка хэша terminals_v3.json и загрузка снимка pickle.
+Каждый запуск идет в отдельном процессе, чтобы время и пиковый RSS (ru_maxrss)
+не зависели от предыдущих запусков. RSS приводится после импорта модулей (база)
+и после подготовки справочника. ru_maxrss наследуется через exec, поэтому
+родительский процесс не импортирует src и собирает снимок тоже в дочернем процессе.
+Снимок собирается во временном каталоге, рабочий снимок не затрагивается.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+
+# Модули src импортируются внутри функций, которые выполняются только в дочерних процессах
+
+def old_import(snapshot_path: str) -> Any:
+    from src.dellin.terminals import load_terminals, terminals_path
+    return load_terminals(terminals_path)
+
+def json_fallback(snapshot_path: str) -> Any:
+    from src.dellin.terminals import TerminalIndex, load_snapshot, load_terminals, terminals_path
+    missing_path = os.path.join(os.path.dirname(snapshot_path), 'missing.snapshot')
+    index = load_snapshot(terminals_path, missing_path)
+    if index is None:
+        index = TerminalIndex.from_terminals_data(load_terminals(terminals_path))
+    return index
+
+def snapshot(snapshot_path: str) -> Any:
+    from src.dellin.terminals import load_snapshot, terminals_path
+    index = load_snapshot(terminals_path, snapshot_path)
+    if index is None:
+        raise SystemExit(f'Снимок {snapshot_path} не загрузился')
+    return index
+
+STEPS: dict[str, Callable[[str], Any]] = {
+    'import': old_import,
+    'fallback': json_fallback,
+    'snapshot': snapshot,
+}
+
+def max_rss_kb() -> int:
+    # В Linux ru_maxrss — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_build(snapshot_path: str) -> None:
+    """Сборка снимка в дочернем процессе: печатает размеры файлов строкой JSON."""
+    from src.dellin.terminals import build_snapshot, terminals_path
+    build_snapshot(terminals_path, snapshot_path)
+    print(json.dumps({'source_size': os.path.getsize(terminals_path), 'snapshot_size': os.path.getsize(snapshot_path)}))
+
+def run_step(name: str, snapshot_path: str) -> None:
+    """Один запуск в дочернем процессе: печатает время и RSS строкой JSON."""
+    # База — RSS после импорта модуля справочника, до подготовки самого справочника
+    import src.dellin.terminals  # noqa: F401
+    base_rss = max_rss_kb()
+    started = time.perf_counter()
+    result = STEPS[name](snapshot_path)
+    elapsed = time.perf_counter() - started
+    peak_rss = max_rss_kb()
+    del result
+    print(json.dumps({'elapsed': elapsed, 'base_rss': base_rss, 'peak_rss': peak_rss}))
+
+def run_child(*args: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-m', 'scripts.bench.terminal_startup', *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(name: str, snapshot_path: str, runs: int) -> list[dict]:
+    return [run_child('--step', name, '--snapshot', snapshot_path) for _ in range(runs)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Подготовка справочника терминалов при запуске')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--step', choices=STEPS, help=argparse.SUPPRESS)
+    parser.add_argument('--snapshot', help=argparse.SUPPRESS)
+    parser.add_argument('--build', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.build:
+        run_build(args.snapshot)
+        return
+    if args.step:
+        run_step(args.step, args.snapshot)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'terminals.snapshot')
+        sizes = run_child('--build', '--snapshot', snapshot_path)
+
+        print(f"terminals_v3.json {sizes['source_size'] / 1024:.0f} КБ, снимок {sizes['snapshot_size'] / 1024:.0f} КБ")
+        for name in STEPS:
+            samples = measure(name, snapshot_path, args.runs)
+            timings = sorted(sample['elapsed'] for sample in samples)
+            base_rss = sorted(sample['base_rss'] for sample in samples)[len(samples) // 2]
+            peak_rss = sorted(sample['peak_rss'] for sample in samples)[len(samples) // 2]
+            print(
+                f'{name:>8}: медиана {timings[len(timings) // 2] * 1000:.2f} мс, минимум {timings[0] * 1000:.2f} мс, '
+                f'RSS {peak_rss / 1024:.1f} МБ (+{(peak_rss - base_rss) / 1024:.1f} МБ к базе {base_rss / 1024:.1f} МБ)'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Проверка планов запросов отзывов: python -m scripts.explain_check [--verbose]
+
+Выполняет EXPLAIN для запросов, которые формируют обработчики отзывов и аутентификации,
+в базе DATABASE_URL и завершается с кодом 1, если хотя бы один план читает reviews или
+users последовательным сканированием или не использует ожидаемый индекс. Перед EXPLAIN отключается enable_seqscan: на
+маленькой локальной базе планировщик иначе выбирает Seq Scan и при наличии индекса,
+а без подходящего индекса Seq Scan остается в плане и при отключенной настройке.
+Код 2 — нет подключения к базе данных.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date
+from typing import Iterator
+
+from sqlalchemy import Select, select, text
+from sqlalchemy.dialects import postgresql
+
+from src.database import engine
+from src.users.models import UserModel
+from src.reviews.models import ReviewModel
+from src.reviews.pagination import encode_cursor
+from src.reviews.queries import review_tree_query
+from src.logger import setup_logger
+
+
+logger = setup_logger('explain_check')
+
+CHECKED_TABLES = {'reviews', 'users'}
+
+# Индексы, которые должен выбрать планировщик; ответы и отзывы пользователя — миграция 8eb6af9f7a26
+EXPECTED_INDEXES = {
+    'get_reviews: первая страница': {'ix_reviews_top_level_created_at_id', 'ix_reviews_replies_parent_id_created_at_id'},
+    'get_reviews: страница по курсору': {'ix_reviews_top_level_created_at_id', 'ix_reviews_replies_parent_id_created_at_id'},
+    'get_user_reviews: первая страница': {'ix_reviews_top_level_user_id_created_at_id', 'ix_reviews_replies_parent_id_created_at_id'},
+    'get_user_reviews: страница по курсору': {'ix_reviews_top_level_user_id_created_at_id', 'ix_reviews_replies_parent_id_created_at_id'},
+    'reviews: все отзывы и ответы пользователя': {'ix_reviews_user_id'},
+}
+
+
+def checked_queries() -> dict[str, Select]:
+    cursor = encode_cursor(ReviewModel(id=1_000_000, created_at=date.today()))
+    return {
+        'get_reviews: первая страница': review_tree_query([], None, 10),
+        'get_reviews: страница по курсору': review_tree_query([], cursor, 10),
+        'get_user_reviews: первая страница': review_tree_query([ReviewModel.user_id == 1], None, 5),
+        'get_user_reviews: страница по курсору': review_tree_query([ReviewModel.user_id == 1], cursor, 5),
+        'create_review: родительский отзыв': select(ReviewModel).where(ReviewModel.id == 1),
+        # Так же выглядит проверка внешнего ключа при удалении пользователя
+        'reviews: все отзывы и ответы пользователя': select(ReviewModel.id).where(ReviewModel.user_id == 1),
+        'get_current_user': select(UserModel).where(UserModel.api_key == 'token'),
+        'login': select(UserModel).where((UserModel.email == 'login') | (UserModel.username == 'login')),
+    }
+
+def iter_plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+def sequential_scans(plan: dict) -> list[str]:
+    return [
+        node['Relation Name']
+        for node in iter_plan_nodes(plan)
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_TABLES
+    ]
+
+def used_indexes(plan: dict) -> set[str]:
+    return {node['Index Name'] for node in iter_plan_nodes(plan) if 'Index Name' in node}
+
+async def explain(query: Select) -> dict:
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    async with engine.connect() as connection:
+        await connection.execute(text('SET LOCAL enable_seqscan = off'))
+        result = await connection.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'))
+        plan = result.scalar()
+        await connection.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+async def run(verbose: bool) -> int:
+    failed = 0
+    try:
+        for name, query in checked_queries().items():
+            try:
+                plan = await explain(query)
+            except OSError as e:
+                logger.error(f"Нет подключения к базе данных: {str(e)}")
+                return 2
+            scans = sequential_scans(plan)
+            indexes = used_indexes(plan)
+            missing = EXPECTED_INDEXES.get(name, set()) - indexes
+            if scans:
+                failed += 1
+                logger.error(f"{name}: последовательное сканирование {', '.join(sorted(set(scans)))}")
+            elif missing:
+                failed += 1
+                logger.error(f"{name}: не используются индексы {', '.join(sorted(missing))}")
+            else:
+                logger.info(f"{name}: индексы используются: {', '.join(sorted(indexes))}")
+            if verbose:
+                print(json.dumps(plan, ensure_ascii=False, indent=2))
+    finally:
+        await engine.dispose()
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Проверка планов запросов отзывов на последовательное сканирование')
+    parser.add_argument('--verbose', action='store_true', help='Печатать планы запросов')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.verbose)))
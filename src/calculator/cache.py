@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from src.cache import TTLCache, MISSING
+from src.calculator.schemas import DeliveryRequest
+from src.database import new_async_session
+from src.models import QuoteCacheEntry
+from src.metrics import metrics
+from src.logger import setup_logger
+
+
+logger = setup_logger('calculator.cache')
+
+QUOTE_CACHE_BACKEND = os.getenv('QUOTE_CACHE_BACKEND', 'memory')
+QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 5 * 60))
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv('QUOTE_CACHE_MAX_ENTRIES', 10000))
+
+# Результаты расчета по службам доставки: {'cdek': [DeliveryResult.model_dump(), ...], ...}
+Quotes = dict[str, list[dict]]
+
+
+@dataclass
+class QuoteOutcome:
+    quotes: Quotes
+    # Службы, не уложившиеся в бюджет времени расчета
+    timed_out: list[str] = field(default_factory=list)
+    # Службы, расчет которых завершился ошибкой
+    failed: list[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """Ответили все службы: только такой расчет можно кэшировать целиком."""
+        return not self.timed_out and not self.failed
+
+
+def make_quote_key(request: DeliveryRequest, shipment_date: str) -> str:
+    payload = request.model_dump(mode='json', exclude={'date'})
+    payload['from_location']['city_name'] = payload['from_location']['city_name'].strip().lower()
+    payload['to_location']['city_name'] = payload['to_location']['city_name'].strip().lower()
+    payload['shipment_date'] = shipment_date
+
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class QuoteCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Quotes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, quotes: Quotes, ttl: int) -> None:
+        ...
+
+
+class InMemoryQuoteCacheBackend(QuoteCacheBackend):
+    def __init__(self, max_entries: int):
+        self._cache = TTLCache(maxsize=max_entries)
+
+    async def get(self, key: str) -> Optional[Quotes]:
+        quotes = self._cache.get(key)
+        return None if quotes is MISSING else quotes
+
+    async def set(self, key: str, quotes: Quotes, ttl: int) -> None:
+        self._cache.set(key, quotes, ttl=ttl)
+
+
+class DatabaseQuoteCacheBackend(QuoteCacheBackend):
+    """Кэш расчетов в таблице quote_cache с вытеснением давно не читавшихся записей."""
+
+    # Вытеснение запускается не на каждую запись, а раз в EVICT_EVERY записей
+    EVICT_EVERY = 100
+    # accessed_at обновляется при чтении, только если устарел больше чем на эту долю TTL:
+    # для вытеснения хватает такой точности, а частые чтения не превращаются в записи
+    TOUCH_FRACTION = 0.1
+
+    def __init__(self, max_entries: int, ttl: int):
+        self._max_entries = max_entries
+        self._touch_interval = timedelta(seconds=ttl * self.TOUCH_FRACTION)
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Quotes]:
+        now = datetime.now(timezone.utc)
+        async with new_async_session() as session:
+            row = (await session.execute(
+                select(QuoteCacheEntry.payload, QuoteCacheEntry.accessed_at)
+                .where(QuoteCacheEntry.key == key, QuoteCacheEntry.expires_at > now)
+            )).first()
+            if row is None:
+                return None
+
+            touch_before = now - self._touch_interval
+            if row.accessed_at < touch_before:
+                # Условие повторяется в UPDATE: из одновременных чтений запись делает одно
+                await session.execute(
+                    update(QuoteCacheEntry)
+                    .where(QuoteCacheEntry.key == key, QuoteCacheEntry.accessed_at < touch_before)
+                    .values(accessed_at=now)
+                )
+                await session.commit()
+            return row.payload
+
+    async def set(self, key: str, quotes: Quotes, ttl: int) -> None:
+        now = datetime.now(timezone.utc)
+        statement = insert(QuoteCacheEntry).values(
+            key=key,
+            payload=quotes,
+            expires_at=now + timedelta(seconds=ttl),
+            accessed_at=now,
+        )
+        async with new_async_session() as session:
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[QuoteCacheEntry.key],
+                    set_={
+                        'payload': statement.excluded.payload,
+                        'expires_at': statement.excluded.expires_at,
+                        'accessed_at': statement.excluded.accessed_at,
+                    },
+                )
+            )
+
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                await self._evict(session, now)
+
+            await session.commit()
+
+    async def _evict(self, session, now: datetime) -> None:
+        await session.execute(delete(QuoteCacheEntry).where(QuoteCacheEntry.expires_at <= now))
+        keep = (
+            select(QuoteCacheEntry.key)
+            .order_by(QuoteCacheEntry.accessed_at.desc())
+            .limit(self._max_entries)
+        )
+        await session.execute(delete(QuoteCacheEntry).where(QuoteCacheEntry.key.not_in(keep)))
+
+
+class QuoteCache:
+    def __init__(self, backend: QuoteCacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str) -> Optional[Quotes]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша расчетов: {str(e)}")
+            return None
+
+    async def set(self, key: str, quotes: Quotes) -> None:
+        if not quotes:
+            return
+        try:
+            await self.backend.set(key, quotes, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка записи в кэш расчетов: {str(e)}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[QuoteOutcome]]) -> QuoteOutcome:
+        quotes = await self.get(key)
+        if quotes is not None:
+            metrics.increment('quote_cache.hits')
+            return QuoteOutcome(quotes=quotes)
+
+        metrics.increment('quote_cache.misses')
+
+        # Одинаковые одновременные запросы ждут один общий расчет
+        task = self.in_flight(key)
+        if task is None:
+            task = self.start_compute(key, compute)
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> Optional[asyncio.Task]:
+        """Идущий расчет по ключу, если он есть; к нему присоединяются одинаковые запросы."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics.increment('quote_cache.coalesced')
+        return task
+
+    def start_compute(self, key: str, compute: Callable[[], Awaitable[QuoteOutcome]]) -> asyncio.Task:
+        """Запускает расчет, к которому могут присоединиться одинаковые запросы; полный результат попадет в кэш.
+
+        Ожидающие должны ждать задачу через asyncio.shield: уход одного клиента не отменяет общий расчет.
+        """
+        task = asyncio.create_task(self._compute_and_store(key, compute))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return task
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[QuoteOutcome]]) -> QuoteOutcome:
+        outcome = await compute()
+        # Неполный расчет не кэшируется: ошибка службы могла быть временной,
+        # а расчет с опоздавшими службами запишет finish_in_background
+        if outcome.complete:
+            await self.set(key, outcome.quotes)
+        return outcome
+
+
+def create_quote_cache() -> QuoteCache:
+    if QUOTE_CACHE_BACKEND == 'database':
+        backend = DatabaseQuoteCacheBackend(QUOTE_CACHE_MAX_ENTRIES, QUOTE_CACHE_TTL)
+    else:
+        backend = InMemoryQuoteCacheBackend(QUOTE_CACHE_MAX_ENTRIES)
+    return QuoteCache(backend, QUOTE_CACHE_TTL)
+
+
+quote_cache = create_quote_cache()
@@ -0,0 +1,52 @@
+from typing import NamedTuple
+
+from src.calculator.schemas import DeliveryPackage
+
+
+class PlaceMetrics(NamedTuple):
+    width: float    # м
+    length: float   # м
+    height: float   # м
+    volume: float   # м³
+    weight: float   # кг
+
+
+class CargoSummary(NamedTuple):
+    places: list[PlaceMetrics]
+    quantity: int
+    total_volume: float
+    total_weight: float
+    # Самое большое по объему место: его габариты передаются как габариты груза,
+    # максимумы по отдельным осям могли бы описать коробку, которой нет в грузе
+    largest_place: PlaceMetrics
+    # Вес самого тяжелого места
+    max_weight: float
+
+
+def summarize_packages(packages: list[DeliveryPackage]) -> CargoSummary:
+    """Переводит габариты мест из см в м, вес из г в кг и считает итоги по грузу за один проход."""
+    places = []
+    total_volume = total_weight = 0.0
+    largest_place = PlaceMetrics(0.0, 0.0, 0.0, 0.0, 0.0)
+    max_weight = 0.0
+
+    for package in packages:
+        width, length, height = package.width / 100, package.length / 100, package.height / 100
+        weight = package.weight / 1000
+        volume = width * length * height
+
+        places.append(PlaceMetrics(width, length, height, volume, weight))
+        total_volume += volume
+        total_weight += weight
+        if volume > largest_place.volume:
+            largest_place = places[-1]
+        max_weight = max(max_weight, weight)
+
+    return CargoSummary(
+        places=places,
+        quantity=len(places),
+        total_volume=total_volume,
+        total_weight=total_weight,
+        largest_place=largest_place,
+        max_weight=max_weight,
+    )
@@ -0,0 +1,161 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Optional
+
+from src.database import SessionDep, new_async_session
+from src.calculator.schemas import DeliveryRequest, DeliveryResult
+from src.cdek.utils import calculate_cdek_delivery, get_cdek_city_code
+from src.pecom.utils import calculate_pecom_delivery, get_pecom_city_code
+from src.dellin.utils import calculate_dellin_delivery, get_dellin_city_code
+
+
+async def with_session(lookup: Callable[[SessionDep, str], Awaitable[Any]], city_name: str) -> Any:
+    # Поиски выполняются параллельно, а AsyncSession нельзя использовать конкурентно
+    async with new_async_session() as session:
+        return await lookup(session, city_name)
+
+
+class CarrierProvider(ABC):
+    """Служба доставки для калькулятора: поиск кода города и расчет тарифов.
+
+    name — идентификатор службы в DeliveryRequest.service, ключах кэша и метриках,
+    title — название для логов. Бюджет времени расчета задается переменной <NAME>_BUDGET.
+    """
+
+    name: str
+    title: str
+
+    @property
+    def budget(self) -> Optional[float]:
+        budget = os.getenv(f'{self.name.upper()}_BUDGET')
+        return float(budget) if budget else None
+
+    @abstractmethod
+    async def get_city_code(self, city_name: str) -> Any:
+        """Код города в справочнике службы или None, если город не найден."""
+
+    @abstractmethod
+    async def calculate(self, request: DeliveryRequest, codes: tuple, shipment_date: str) -> list[DeliveryResult]:
+        ...
+
+
+class CdekProvider(CarrierProvider):
+    name = 'cdek'
+    title = 'СДЭК'
+
+    async def get_city_code(self, city_name: str) -> Any:
+        return await with_session(get_cdek_city_code, city_name)
+
+    async def calculate(self, request: DeliveryRequest, codes: tuple, shipment_date: str) -> list[DeliveryResult]:
+        async with new_async_session() as session:
+            cdek_result = await calculate_cdek_delivery(
+                session=session,
+                from_location_code=codes[0],
+                to_location_code=codes[1],
+                packages=request.packages,
+                date=shipment_date,
+                currency=request.currency,
+                lang=request.lang,
+                delivery_type=request.delivery_type,
+            )
+
+        return [
+            DeliveryResult(
+                service_name='СДЭК',
+                delivery_sum=cdek_result['delivery_sum'],
+                period_min=cdek_result['period_min'],
+                period_max=cdek_result['period_max'],
+                service_url=cdek_result['service_url'],
+                service_logo=cdek_result['service_logo']
+            )
+        ]
+
+
+class PecomProvider(CarrierProvider):
+    name = 'pecom'
+    title = 'ПЭК'
+
+    async def get_city_code(self, city_name: str) -> Any:
+        return await get_pecom_city_code(city_name)
+
+    async def calculate(self, request: DeliveryRequest, codes: tuple, shipment_date: str) -> list[DeliveryResult]:
+        pecom_results = await calculate_pecom_delivery(
+            from_city_id=codes[0],
+            to_city_id=codes[1],
+            packages=request.packages,
+            delivery_type=request.delivery_type,
+        )
+
+        return [
+            DeliveryResult(
+                service_name=pecom_result['service_name'],
+                delivery_sum=pecom_result['delivery_sum'],
+                period_min=pecom_result['period_min'],
+                period_max=pecom_result['period_max'],
+                service_url=pecom_result['service_url'],
+                service_logo=pecom_result['service_logo']
+            )
+            for pecom_result in pecom_results
+        ]
+
+
+class DellinProvider(CarrierProvider):
+    name = 'dellin'
+    title = 'Деловых Линий'
+
+    async def get_city_code(self, city_name: str) -> Any:
+        return await with_session(get_dellin_city_code, city_name)
+
+    async def calculate(self, request: DeliveryRequest, codes: tuple, shipment_date: str) -> list[DeliveryResult]:
+        async with new_async_session() as session:
+            dellin_results = await calculate_dellin_delivery(
+                session=session,
+                from_city_code=codes[0],
+                to_city_code=codes[1],
+                packages=request.packages,
+                delivery_type=request.delivery_type,
+                date=shipment_date,
+            )
+
+        return [
+            DeliveryResult(
+                delivery_sum=dellin_result['delivery_sum'],
+                period_min=dellin_result['period_min'],
+                period_max=dellin_result['period_max'],
+                service_name=dellin_result['service_name'],
+                service_url=dellin_result['service_url'],
+                service_logo=dellin_result['service_logo'],
+            )
+            for dellin_result in dellin_results
+        ]
+
+
+class CarrierRegistry:
+    """Подключенные службы доставки. Калькулятор опрашивает службы только через реестр."""
+
+    def __init__(self):
+        self._providers: dict[str, CarrierProvider] = {}
+
+    def register(self, provider: CarrierProvider) -> CarrierProvider:
+        self._providers[provider.name] = provider
+        return provider
+
+    def get(self, name: str) -> CarrierProvider:
+        return self._providers[name]
+
+    def select(self, service: str) -> list[CarrierProvider]:
+        """Службы, выбранные в DeliveryRequest.service: одна по имени или все для 'all'."""
+        if service == 'all':
+            return list(self._providers.values())
+        if service not in self._providers:
+            raise ValueError(f"Служба доставки не поддерживается: {service}")
+        return [self._providers[service]]
+
+    def __iter__(self):
+        return iter(self._providers.values())
+
+
+carrier_registry = CarrierRegistry()
+carrier_registry.register(CdekProvider())
+carrier_registry.register(PecomProvider())
+carrier_registry.register(DellinProvider())
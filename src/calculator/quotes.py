@@ -0,0 +1,173 @@
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from src.calculator.schemas import DeliveryRequest
+from src.calculator.cache import QuoteOutcome, quote_cache
+from src.calculator.providers import carrier_registry
+from src.calculator.resolution import resolve_carrier_city_codes
+from src.circuit_breaker import carrier_guards
+from src.metrics import metrics
+from src.logger import setup_logger
+
+
+logger = setup_logger('calculator.quotes')
+
+# Общий бюджет времени на расчет, в секундах; бюджеты служб — CarrierProvider.budget
+CALCULATE_BUDGET = float(os.getenv('CALCULATE_BUDGET', 8))
+# Дожидаться в фоне служб, не уложившихся в бюджет, чтобы дополнить кэш расчетов
+CALCULATE_BACKGROUND_COMPLETION = os.getenv('CALCULATE_BACKGROUND_COMPLETION', '1') == '1'
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+CityCodeResolver = Callable[[str, str, str], Awaitable[tuple]]
+
+
+async def quote_carrier(
+    carrier: str,
+    request: DeliveryRequest,
+    shipment_date: str,
+    resolve: CityCodeResolver = resolve_carrier_city_codes,
+) -> list[dict]:
+    # Поиск городов идет внутри вызова службы: при разомкнутой цепи он не начинается,
+    # а сбои API городов и токенов учитываются в цепи. Неизвестный город — ошибка запроса
+    # (ValueError), сбоем службы не считается
+    async with carrier_guards.get(carrier).call():
+        codes = await resolve(
+            carrier,
+            request.from_location.city_name,
+            request.to_location.city_name,
+        )
+        results = await carrier_registry.get(carrier).calculate(request, codes, shipment_date)
+    return [result.model_dump() for result in results]
+
+def start_carrier_tasks(
+    request: DeliveryRequest,
+    shipment_date: str,
+    resolve: CityCodeResolver = resolve_carrier_city_codes,
+) -> dict[str, asyncio.Task]:
+    # Каждая служба сама определяет коды городов и сразу переходит к расчету,
+    # поэтому все поиски городов и расчеты идут параллельно. Опрашиваются только службы из request.service
+    providers = carrier_registry.select(request.service)
+    logger.info(f"Запуск параллельного расчета для служб доставки: {', '.join(provider.name for provider in providers)}")
+    return {
+        provider.name: asyncio.create_task(quote_carrier(provider.name, request, shipment_date, resolve))
+        for provider in providers
+    }
+
+def carrier_title(carrier: str) -> str:
+    return carrier_registry.get(carrier).title
+
+def carrier_budget(carrier: str) -> float:
+    budget = carrier_registry.get(carrier).budget
+    return min(budget, CALCULATE_BUDGET) if budget is not None else CALCULATE_BUDGET
+
+def collect_carrier_result(carrier: str, task: asyncio.Task) -> Optional[list[dict]]:
+    title = carrier_title(carrier)
+    if task.cancelled():
+        logger.error(f"Расчет {title} отменен")
+        return None
+    if task.exception() is not None:
+        logger.error(f"Ошибка API {title}: {str(task.exception())}")
+        return None
+
+    logger.info(f"Успешно получен расчет {title}")
+    return task.result()
+
+async def finish_in_background(quote_key: str, late: dict[asyncio.Task, str], outcome: QuoteOutcome) -> None:
+    """Дожидается всех опоздавших служб и записывает полный расчет в кэш одним вызовом.
+
+    Запись делается только после того, как завершились все опоздавшие службы, поэтому
+    в кэш не попадает расчет, в котором часть служб еще считается.
+    """
+    await asyncio.wait(late)
+
+    quotes = dict(outcome.quotes)
+    complete = not outcome.failed
+    for task, carrier in late.items():
+        results = collect_carrier_result(carrier, task)
+        if results is None:
+            complete = False
+        else:
+            quotes[carrier] = results
+
+    # Ошибка службы могла быть временной, такой расчет не кэшируется
+    if complete:
+        await quote_cache.set(quote_key, quotes)
+
+def handle_timed_out(carrier: str, task: asyncio.Task, late: dict[asyncio.Task, str]) -> None:
+    logger.warning(f"Расчет {carrier_title(carrier)} не уложился в бюджет {carrier_budget(carrier)} с")
+    metrics.increment(f'calculator.{carrier}.timeouts')
+
+    if not CALCULATE_BACKGROUND_COMPLETION:
+        task.cancel()
+        return
+
+    late[task] = carrier
+
+def complete_in_background(quote_key: str, late: dict[asyncio.Task, str], outcome: QuoteOutcome) -> None:
+    background = asyncio.create_task(finish_in_background(quote_key, late, outcome))
+    _background_tasks.add(background)
+    background.add_done_callback(_background_tasks.discard)
+
+async def iter_carrier_quotes(
+    request: DeliveryRequest,
+    shipment_date: str,
+    quote_key: str,
+    outcome: QuoteOutcome,
+    resolve: CityCodeResolver = resolve_carrier_city_codes,
+) -> AsyncIterator[tuple[str, str, Optional[list[dict]]]]:
+    """Отдает результаты служб доставки по мере готовности: (служба, статус, результаты).
+
+    Статус: 'ok', 'error' или 'timeout'. Итоги накапливаются в outcome.
+    Каждая служба ждется не дольше своего бюджета, общий бюджет ограничивает все ожидания сверху.
+    Службы, не уложившиеся в бюджет, после ответа остальных досчитываются в фоне.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = start_carrier_tasks(request, shipment_date, resolve)
+    pending = {task: carrier for carrier, task in tasks.items()}
+    deadlines = {carrier: loop.time() + carrier_budget(carrier) for carrier in tasks}
+    # Опоздавшие службы, которые досчитываются для кэша
+    late: dict[asyncio.Task, str] = {}
+
+    try:
+        while pending:
+            timeout = min(deadlines[carrier] for carrier in pending.values()) - loop.time()
+            done, _ = await asyncio.wait(pending, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                carrier = pending.pop(task)
+                results = collect_carrier_result(carrier, task)
+                if results is None:
+                    outcome.failed.append(carrier)
+                    yield carrier, 'error', None
+                else:
+                    outcome.quotes[carrier] = results
+                    yield carrier, 'ok', results
+
+            now = loop.time()
+            for task, carrier in list(pending.items()):
+                if deadlines[carrier] <= now:
+                    del pending[task]
+                    outcome.timed_out.append(carrier)
+                    handle_timed_out(carrier, task, late)
+                    yield carrier, 'timeout', None
+    finally:
+        if late and not pending:
+            complete_in_background(quote_key, late, outcome)
+        else:
+            # Клиент перестал читать поток: неполученные и опоздавшие расчеты больше не нужны
+            for task in (*pending, *late):
+                task.cancel()
+
+async def compute_quotes(
+    request: DeliveryRequest,
+    shipment_date: str,
+    quote_key: str,
+    resolve: CityCodeResolver = resolve_carrier_city_codes,
+) -> QuoteOutcome:
+    outcome = QuoteOutcome(quotes={})
+    async for _ in iter_carrier_quotes(request, shipment_date, quote_key, outcome, resolve):
+        pass
+    return outcome
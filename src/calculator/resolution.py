@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any
+
+from src.calculator.providers import carrier_registry
+from src.logger import setup_logger
+
+
+logger = setup_logger('calculator.resolution')
+
+
+def check_city_codes(carrier: str, from_city_name: str, to_city_name: str, from_code: Any, to_code: Any) -> tuple[Any, Any]:
+    if from_code is None or to_code is None:
+        logger.error(f"Не удалось определить коды городов {carrier}: {from_city_name} -> {to_city_name}")
+        raise ValueError(f"Не удалось определить коды городов: {from_city_name} -> {to_city_name}")
+
+    return from_code, to_code
+
+async def resolve_carrier_city_codes(carrier: str, from_city_name: str, to_city_name: str) -> tuple[Any, Any]:
+    """Параллельно определяет коды городов отправления и назначения в службе доставки."""
+    provider = carrier_registry.get(carrier)
+    from_code, to_code = await asyncio.gather(
+        provider.get_city_code(from_city_name),
+        provider.get_city_code(to_city_name),
+    )
+    return check_city_codes(carrier, from_city_name, to_city_name, from_code, to_code)
+
+
+class BatchCityResolver:
+    """Определение кодов городов в пределах пакетного расчета: каждый город ищется в каждой службе один раз.
+
+    Общий поиск ждется через asyncio.shield: отмена одной заявки не отменяет поиск,
+    который ждут другие. Поиск, завершившийся ошибкой или отменой, удаляется, и
+    следующие заявки ищут город заново.
+    """
+
+    def __init__(self):
+        self._lookups: dict[tuple[str, str], asyncio.Future] = {}
+
+    def _lookup(self, carrier: str, city_name: str) -> asyncio.Future:
+        key = (carrier, city_name.strip().lower())
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            lookup = asyncio.ensure_future(carrier_registry.get(carrier).get_city_code(city_name))
+            lookup.add_done_callback(lambda done: self._forget_failed(key, done))
+            self._lookups[key] = lookup
+        return asyncio.shield(lookup)
+
+    def _forget_failed(self, key: tuple[str, str], lookup: asyncio.Future) -> None:
+        if (lookup.cancelled() or lookup.exception() is not None) and self._lookups.get(key) is lookup:
+            del self._lookups[key]
+
+    async def __call__(self, carrier: str, from_city_name: str, to_city_name: str) -> tuple[Any, Any]:
+        from_code, to_code = await asyncio.gather(
+            self._lookup(carrier, from_city_name),
+            self._lookup(carrier, to_city_name),
+        )
+        return check_city_codes(carrier, from_city_name, to_city_name, from_code, to_code)
@@ -1,137 +1,181 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 import asyncio
-from src.database import SessionDep
+import json
+import os
+from typing import AsyncIterator, List
 from src.calculator.schemas import DeliveryRequest, DeliveryResponse, DeliveryResult
-from src.cdek.utils import calculate_cdek_delivery, get_cdek_city_code, normalize_delivery_date_cdek
-from src.pecom.utils import calculate_pecom_delivery
-from src.dellin.utils import get_dellin_city_code, calculate_dellin_delivery
+from src.calculator.cache import QuoteOutcome, make_quote_key, quote_cache
+from src.calculator.quotes import CityCodeResolver, compute_quotes, iter_carrier_quotes
+from src.calculator.resolution import BatchCityResolver, resolve_carrier_city_codes
+from src.metrics import metrics
+from src.cdek.utils import normalize_delivery_date_cdek
 from src.logger import setup_logger
 
 
 logger = setup_logger('calculator')
 calculator_router = APIRouter(tags=['calculator'])
 
-@calculator_router.post('/api/v1/public/calculate', response_model=DeliveryResponse)
-async def calculate_delivery(
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 10))
+
+async def quote_delivery(
     request: DeliveryRequest,
-    session: SessionDep,
-):
+    resolve: CityCodeResolver = resolve_carrier_city_codes,
+) -> DeliveryResponse:
+    logger.info(f"Начало расчета доставки из {request.from_location.city_name} в {request.to_location.city_name}")
+    shipment_date = normalize_delivery_date_cdek(request.date)
+
+    quote_key = make_quote_key(request, shipment_date)
+    outcome = await quote_cache.get_or_compute(
+        quote_key,
+        lambda: compute_quotes(request, shipment_date, quote_key, resolve),
+    )
+
+    results = [
+        DeliveryResult(**result)
+        for carrier_results in outcome.quotes.values()
+        for result in carrier_results
+    ]
+
+    if not results:
+        logger.error("Не удалось получить данные ни от одной службы доставки")
+        raise HTTPException(status_code=502, detail='Не удалось получить данные ни от одного сервиса')
+
+    logger.info(f"Успешно рассчитана доставка с {len(results)} результатами")
+    return DeliveryResponse(
+        from_location=request.from_location,
+        to_location=request.to_location,
+        packages=request.packages,
+        delivery_type=request.delivery_type,
+        shipment_date=shipment_date,
+        results=results,
+        timed_out=outcome.timed_out,
+    )
+
+@calculator_router.post('/api/v1/public/calculate', response_model=DeliveryResponse)
+async def calculate_delivery(request: DeliveryRequest):
     try:
-        logger.info(f"Начало расчета доставки из {request.from_location.city_name} в {request.to_location.city_name}")
-        shipment_date = normalize_delivery_date_cdek(request.date)
+        return await quote_delivery(request)
+    except Exception as e:
+        logger.error(f"Непредвиденная ошибка при расчете доставки: {str(e)}")
+        raise HTTPException(status_code=502, detail=f'API error: {str(e)}')
 
-        from_code = await get_cdek_city_code(session, request.from_location.city_name)
-        to_code = await get_cdek_city_code(session, request.to_location.city_name)
-
-        if from_code is None or to_code is None:
-            logger.error(f"Не удалось определить код города для {request.from_location.city_name} или {request.to_location.city_name}")
-            raise HTTPException(status_code=400, detail='Не удалось определить код города')
-
-        # Создаем корутины для каждого сервиса
-        cdek_coroutine = calculate_cdek_delivery(
-            session=session,
-            from_location_code=from_code,
-            to_location_code=to_code,
-            packages=request.packages,
-            date=shipment_date,
-            currency=request.currency,
-            lang=request.lang,
-            delivery_type=request.delivery_type,
-        )
-
-        pecom_coroutine = calculate_pecom_delivery(
-            from_city_name=request.from_location.city_name,
-            to_city_name=request.to_location.city_name,
-            packages=request.packages,
-            delivery_type=request.delivery_type,
-            session=session,
-        )
-
-        dellin_coroutine = calculate_dellin_delivery(
-            session=session,
-            from_location=request.from_location.city_name,
-            to_location=request.to_location.city_name,
-            packages=request.packages,
-            delivery_type=request.delivery_type,
-            date=shipment_date,
-        )
-
-        # Запускаем все корутины параллельно
-        logger.info("Запуск параллельного расчета для всех служб доставки")
-        cdek_result, pecom_results, dellin_results = await asyncio.gather(
-            cdek_coroutine,
-            pecom_coroutine,
-            dellin_coroutine,
-            return_exceptions=True
-        )
-
-        results = []
-
-        # Обрабатываем результаты CDEK
-        if isinstance(cdek_result, Exception):
-            logger.error(f"Ошибка API СДЭК: {str(cdek_result)}")
+async def stream_batch_frames(requests: List[DeliveryRequest]) -> AsyncIterator[str]:
+    # Коды городов определяются один раз на весь пакет, одновременно считается не больше BATCH_CONCURRENCY заявок
+    resolve = BatchCityResolver()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def quote_item(index: int, request: DeliveryRequest) -> dict:
+        async with semaphore:
+            try:
+                response = await quote_delivery(request, resolve)
+                return {'index': index, 'status': 'ok', 'response': response.model_dump(mode='json')}
+            except Exception as e:
+                logger.error(f"Ошибка расчета заявки {index} пакета: {str(e)}")
+                detail = e.detail if isinstance(e, HTTPException) else f'API error: {str(e)}'
+                return {'index': index, 'status': 'error', 'detail': detail}
+
+    tasks = [asyncio.create_task(quote_item(index, request)) for index, request in enumerate(requests)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield ndjson_frame(await task)
+    finally:
+        # Клиент мог отключиться: ожидание заявок больше не нужно. Начатые расчеты и поиски
+        # городов не отменяются — их через кэш расчетов могут ждать одинаковые запросы /calculate
+        for task in tasks:
+            task.cancel()
+
+@calculator_router.post('/api/v1/public/calculate/batch')
+async def calculate_delivery_batch(requests: List[DeliveryRequest]):
+    """Пакетный расчет: по строке NDJSON на каждую заявку в порядке готовности, с полем index — номером заявки в запросе."""
+    if len(requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f'Слишком много заявок в пакете, максимум: {BATCH_MAX_ITEMS}')
+
+    logger.info(f"Начало пакетного расчета доставки: {len(requests)} заявок")
+    return StreamingResponse(stream_batch_frames(requests), media_type='application/x-ndjson')
+
+async def stream_quotes_to_queue(
+    request: DeliveryRequest,
+    shipment_date: str,
+    quote_key: str,
+    events: asyncio.Queue,
+) -> QuoteOutcome:
+    """Общий расчет потокового запроса: результаты служб по мере готовности кладутся в events, в конце — None.
+
+    Расчет идет отдельной задачей в кэше расчетов: к нему присоединяются одинаковые запросы,
+    и он не прерывается, если клиент потока отключился.
+    """
+    outcome = QuoteOutcome(quotes={})
+    try:
+        async for event in iter_carrier_quotes(request, shipment_date, quote_key, outcome):
+            events.put_nowait(event)
+    finally:
+        events.put_nowait(None)
+    return outcome
+
+async def stream_quote_frames(request: DeliveryRequest, shipment_date: str) -> AsyncIterator[str]:
+    quote_key = make_quote_key(request, shipment_date)
+
+    cached_quotes = await quote_cache.get(quote_key)
+    if cached_quotes is not None:
+        metrics.increment('quote_cache.hits')
+        outcome = QuoteOutcome(quotes=cached_quotes)
+        for carrier, results in cached_quotes.items():
+            yield ndjson_frame({'event': 'result', 'carrier': carrier, 'results': results})
+    else:
+        metrics.increment('quote_cache.misses')
+        task = quote_cache.in_flight(quote_key)
+        if task is not None:
+            # Такой же расчет уже идет: его результаты отдаются после завершения, службы повторно не опрашиваются
+            outcome = await asyncio.shield(task)
+            for carrier, results in outcome.quotes.items():
+                yield ndjson_frame({'event': 'result', 'carrier': carrier, 'results': results})
+            for carrier in outcome.timed_out:
+                yield ndjson_frame({'event': 'timeout', 'carrier': carrier})
+            for carrier in outcome.failed:
+                yield ndjson_frame({'event': 'error', 'carrier': carrier})
         else:
-            logger.info("Успешно получен расчет СДЭК")
-            results.append(
-                DeliveryResult(
-                    service_name='СДЭК',
-                    delivery_sum=cdek_result['delivery_sum'],
-                    period_min=cdek_result['period_min'],
-                    period_max=cdek_result['period_max'],
-                    service_url=cdek_result['service_url'],
-                    service_logo=cdek_result['service_logo']
-                )
+            events: asyncio.Queue = asyncio.Queue()
+            task = quote_cache.start_compute(
+                quote_key,
+                lambda: stream_quotes_to_queue(request, shipment_date, quote_key, events),
             )
-
-        # Обрабатываем результаты ПЭК
-        if isinstance(pecom_results, Exception):
-            logger.error(f"Ошибка API ПЭК: {str(pecom_results)}")
-        else:
-            logger.info("Успешно получен расчет ПЭК")
-            for pecom_result in pecom_results:
-                results.append(
-                    DeliveryResult(
-                        service_name=pecom_result['service_name'],
-                        delivery_sum=pecom_result['delivery_sum'],
-                        period_min=pecom_result['period_min'],
-                        period_max=pecom_result['period_max'],
-                        service_url=pecom_result['service_url'],
-                        service_logo=pecom_result['service_logo']
-                    )
-                )
-
-        # Обрабатываем результаты Деловых Линий
-        if isinstance(dellin_results, Exception):
-            logger.error(f"Ошибка API Деловых Линий: {str(dellin_results)}")
-        else:
-            logger.info("Успешно получен расчет Деловых Линий")
-            for dellin_result in dellin_results:
-                results.append(
-                    DeliveryResult(
-                        delivery_sum=dellin_result['delivery_sum'],
-                        period_min=dellin_result['period_min'],
-                        period_max=dellin_result['period_max'],
-                        service_name=dellin_result['service_name'],
-                        service_url=dellin_result['service_url'],
-                        service_logo=dellin_result['service_logo'],
-                    )
-                )
-
-        if not results:
-            logger.error("Не удалось получить данные ни от одной службы доставки")
-            raise HTTPException(status_code=502, detail='Не удалось получить данные ни от одного сервиса')
-
-        logger.info(f"Успешно рассчитана доставка с {len(results)} результатами")
-        return DeliveryResponse(
-            from_location=request.from_location,
-            to_location=request.to_location,
-            packages=request.packages,
-            delivery_type=request.delivery_type,
-            shipment_date=shipment_date,
-            results=results,
-        )
-
+            while (event := await events.get()) is not None:
+                carrier, status, results = event
+                if status == 'ok':
+                    yield ndjson_frame({'event': 'result', 'carrier': carrier, 'results': results})
+                else:
+                    yield ndjson_frame({'event': status, 'carrier': carrier})
+            outcome = await asyncio.shield(task)
+
+    results_count = sum(len(results) for results in outcome.quotes.values())
+    logger.info(f"Потоковый расчет доставки завершен с {results_count} результатами")
+    yield ndjson_frame({
+        'event': 'summary',
+        'from_location': request.from_location.model_dump(),
+        'to_location': request.to_location.model_dump(),
+        'shipment_date': shipment_date,
+        'results_count': results_count,
+        'timed_out': outcome.timed_out,
+        'failed': outcome.failed,
+    })
+
+def ndjson_frame(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False) + '\n'
+
+@calculator_router.post('/api/v1/public/calculate/stream')
+async def calculate_delivery_stream(request: DeliveryRequest):
+    """Потоковый расчет: результат каждой службы отправляется строкой NDJSON сразу после получения,
+    последняя строка (event=summary) содержит итоги расчета."""
+    logger.info(f"Начало потокового расчета доставки из {request.from_location.city_name} в {request.to_location.city_name}")
+    try:
+        shipment_date = normalize_delivery_date_cdek(request.date)
     except Exception as e:
         logger.error(f"Непредвиденная ошибка при расчете доставки: {str(e)}")
-        raise HTTPException(status_code=502, detail=f'API error: {str(e)}')
-    
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f'Некорректный запрос: {str(e)}')
+
+    return StreamingResponse(
+        stream_quote_frames(request, shipment_date),
+        media_type='application/x-ndjson',
+    )
\ No newline at end of file
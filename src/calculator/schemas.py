@@ -1,6 +1,6 @@
-from typing import List, Literal, Optional
+from typing import List, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 
 class DeliveryLocation(BaseModel):
@@ -13,7 +13,8 @@ class DeliveryPackage(BaseModel):
     height: int    
 
 class DeliveryRequest(BaseModel):
-    service: Literal['cdek', 'pecom', 'all']
+    # Имя службы из carrier_registry или 'all'
+    service: str
     from_location: DeliveryLocation
     to_location: DeliveryLocation
     packages: List[DeliveryPackage]
@@ -22,6 +23,14 @@ class DeliveryRequest(BaseModel):
     currency: Optional[int] = 1
     lang: Optional[str] = 'rus'
 
+    @field_validator('service')
+    @classmethod
+    def check_service(cls, service: str) -> str:
+        # Импорт внутри функции: src.calculator.providers сам импортирует эти схемы
+        from src.calculator.providers import carrier_registry
+        carrier_registry.select(service)
+        return service
+
 class DeliveryResult(BaseModel):
     service_name: str
     delivery_sum: int
@@ -36,4 +45,6 @@ class DeliveryResponse(BaseModel):
     packages: List[DeliveryPackage]
     delivery_type: Optional[int] = 1
     shipment_date: Optional[datetime] = None  
-    results: List[DeliveryResult]
\ No newline at end of file
+    results: List[DeliveryResult]
+    # Службы, не ответившие за отведенное время; их результаты в ответ не вошли
+    timed_out: List[str] = []
\ No newline at end of file
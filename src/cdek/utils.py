@@ -1,17 +1,25 @@
 from datetime import datetime, timedelta, timezone, date, time
-from typing import Optional
+from typing import Awaitable, Callable, Optional, TypeVar
 
 import httpx
 from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
 
 from src.database import SessionDep
-from src.models import DeliveryAPICredentials
+from src.models import DeliveryAPICredentials, CdekCityCache
 from src.cdek.schemas import DeliveryPackage
-from src.logger import setup_logger
+from src.http_clients import get_http_client
+from src.credentials import CredentialManager
+from src.cache import TTLCache, MISSING
+from src.metrics import metrics
+from src.singleflight import single_flight, canonical_key
+from src.logger import setup_logger, PAYLOAD
 
 
 logger = setup_logger('cdek')
 
+T = TypeVar('T')
+
 DELIVERY_TYPE_TO_TARIFF = {
     1: 136,  # Склад-Склад
     2: 137,  # Склад-Дверь
@@ -20,68 +28,59 @@ DELIVERY_TYPE_TO_TARIFF = {
 }
 CDEK_AUTH_URL = 'https://api.edu.cdek.ru/v2/oauth/token'
 CDEK_CALC_URL = 'https://api.edu.cdek.ru/v2/calculator/tariff'
+CDEK_CITIES_URL = 'https://api.edu.cdek.ru/v2/location/cities'
 SERVICE_NAME = 'cdek'
 CDEK_BASE_URL = 'https://www.cdek.ru/ru'
 CDEK_LOGO = 'https://upload.wikimedia.org/wikipedia/commons/f/f8/CDEK_logo.svg'
+CDEK_CITY_CACHE_SIZE = 10000
 
+city_code_cache = TTLCache(maxsize=CDEK_CITY_CACHE_SIZE)
 
-async def get_cdek_token(session: SessionDep) -> str:
-    now = datetime.now(timezone.utc)
-
-    result = await session.execute(
-        select(DeliveryAPICredentials).where(DeliveryAPICredentials.service_name == SERVICE_NAME)
-    )
-    creds = result.scalars().first()
 
-    if creds and creds.token and creds.expires_at and creds.expires_at > now:
-        return creds.token
-
-    if not creds:
-        creds = DeliveryAPICredentials(
-            service_name=SERVICE_NAME,
-            client_login='',
-            client_secret='',
-        )
-        session.add(creds)
-        await session.commit()
+async def request_cdek_token(creds: DeliveryAPICredentials) -> tuple[str, datetime]:
+    now = datetime.now(timezone.utc)
 
     logger.info(f"Запрос токена CDEK. Параметры: grant_type=client_credentials, client_id={creds.client_login}")
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            CDEK_AUTH_URL,
-            data={
-                'grant_type': 'client_credentials',
-                'client_id': creds.client_login,
-                'client_secret': creds.client_secret,
-            },
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-        )
+    client = get_http_client('cdek')
+    response = await client.post(
+        CDEK_AUTH_URL,
+        data={
+            'grant_type': 'client_credentials',
+            'client_id': creds.client_login,
+            'client_secret': creds.client_secret,
+        },
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+    )
 
     if response.status_code != 200:
         logger.error(f"Ошибка получения токена CDEK. Статус: {response.status_code}, Ответ: {response.text}")
+        # Ответ 5xx — сбой службы, его должна учесть цепь
+        response.raise_for_status()
         raise Exception(f'Failed to get CDEK token: {response.text}')
 
     data = response.json()
-    logger.info(f"Успешно получен токен CDEK. Ответ: {data}")
+    logger.info("Успешно получен токен CDEK. Ответ: %s", data, extra=PAYLOAD)
     token = data['access_token']
     expires_in = data['expires_in']
-    expires_at = now + timedelta(seconds=expires_in)
+    return token, now + timedelta(seconds=expires_in)
 
-    if creds:
-        creds.token = token
-        creds.expires_at = expires_at
-    else:
-        creds = DeliveryAPICredentials(
-            service_name=SERVICE_NAME,
-            client_login='',
-            client_secret='',
-            token=token,
-            expires_at=expires_at,
-        )
-        session.add(creds)
+cdek_credentials = CredentialManager(SERVICE_NAME, 'CDEK', refresh=request_cdek_token)
 
-    await session.commit()
-    return token
+async def get_cdek_token(session: SessionDep) -> str:
+    return await cdek_credentials.get_token(session)
+
+async def call_with_cdek_token(session: SessionDep, call: Callable[[str], Awaitable[T]]) -> T:
+    """Выполняет запрос к CDEK с токеном. Если CDEK отклонил токен раньше срока (401),
+    токен обновляется и запрос повторяется один раз."""
+    access_token = await get_cdek_token(session)
+    try:
+        return await call(access_token)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 401:
+            raise
+        logger.warning("CDEK отклонил токен, токен будет обновлен")
+        cdek_credentials.invalidate(access_token)
+        return await call(await get_cdek_token(session))
 
 async def calculate_cdek_delivery(
     session: SessionDep,
@@ -94,8 +93,6 @@ async def calculate_cdek_delivery(
     lang: Optional[str] = None,
     delivery_type: Optional[int] = None,
 ) -> dict:
-    access_token = await get_cdek_token(session)
-
     if tariff_code is None:
         tariff_code = DELIVERY_TYPE_TO_TARIFF.get(delivery_type, 136)
 
@@ -113,41 +110,94 @@ async def calculate_cdek_delivery(
     if lang is not None:
         payload['lang'] = lang
 
+    data = await call_with_cdek_token(session, lambda access_token: request_cdek_tariff(payload, access_token))
+    return {
+        **data,
+        'service_url': CDEK_BASE_URL,
+        'service_logo': CDEK_LOGO,
+    }
+
+@single_flight('cdek.tariff', key=lambda payload, access_token: canonical_key(payload))
+async def request_cdek_tariff(payload: dict, access_token: str) -> dict:
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
 
-    logger.info(f"Запрос расчета стоимости CDEK. Параметры: {payload}")
-    async with httpx.AsyncClient() as client:
-        response = await client.post(CDEK_CALC_URL, json=payload, headers=headers)
-        response.raise_for_status()
+    logger.info("Запрос расчета стоимости CDEK. Параметры: %s", payload, extra=PAYLOAD)
+    client = get_http_client('cdek')
+    response = await client.post(CDEK_CALC_URL, json=payload, headers=headers)
+    response.raise_for_status()
 
     data = response.json()
-    logger.info(f"Ответ расчета стоимости CDEK: {data}")
-    data['service_url'] = CDEK_BASE_URL
-    data['service_logo'] = CDEK_LOGO
-
+    logger.info("Ответ расчета стоимости CDEK: %s", data, extra=PAYLOAD)
     return data
 
+def normalize_city_name(city_name: str) -> str:
+    return city_name.strip().lower()
+
+async def save_cdek_city_codes(session: SessionDep, city_codes: dict[str, int]) -> None:
+    if not city_codes:
+        return
+
+    await session.execute(
+        insert(CdekCityCache)
+        .values([
+            {'city_name': city_name, 'city_code': city_code}
+            for city_name, city_code in city_codes.items()
+        ])
+        .on_conflict_do_nothing(index_elements=[CdekCityCache.city_name])
+    )
+    await session.commit()
+
+    for city_name, city_code in city_codes.items():
+        city_code_cache.set(city_name, city_code)
+
 async def get_cdek_city_code(session: SessionDep, city_name: str) -> Optional[int]:
-    access_token = await get_cdek_token(session)
+    key = normalize_city_name(city_name)
+
+    city_code = city_code_cache.get(key)
+    if city_code is not MISSING:
+        metrics.increment('cdek.city_cache.hits')
+        return city_code
 
+    city_code = await session.scalar(
+        select(CdekCityCache.city_code)
+        .where(CdekCityCache.city_name == key)
+    )
+    if city_code is not None:
+        logger.info(f"Найден кэшированный код города CDEK: {city_name} -> {city_code}")
+        metrics.increment('cdek.city_cache.hits')
+        metrics.increment('cdek.city_cache.db_hits')
+        city_code_cache.set(key, city_code)
+        return city_code
+
+    metrics.increment('cdek.city_cache.misses')
+    city_code = await call_with_cdek_token(session, lambda access_token: request_cdek_city_code(access_token, city_name))
+    if city_code is not None:
+        await save_cdek_city_codes(session, {key: city_code})
+
+    return city_code
+
+@single_flight('cdek.city_code', key=lambda access_token, city_name: normalize_city_name(city_name))
+async def request_cdek_city_code(access_token: str, city_name: str) -> Optional[int]:
     logger.info(f"Запрос кода города CDEK. Город: {city_name}")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.edu.cdek.ru/v2/location/cities",
-            headers={'Authorization': f'Bearer {access_token}'},
-            params={'country_codes': 'RU', 'city': city_name}
-        )
-        if response.status_code != 200:
-            logger.error(f"Ошибка получения кода города CDEK. Статус: {response.status_code}, Ответ: {response.text}")
-            return None
-
-        data = response.json()
-        logger.info(f"Ответ поиска города CDEK: {data}")
-        if isinstance(data, list) and data:
-            return data[0]['code']
+    client = get_http_client('cdek')
+    response = await client.get(
+        CDEK_CITIES_URL,
+        headers={'Authorization': f'Bearer {access_token}'},
+        params={'country_codes': 'RU', 'city': city_name}
+    )
+    if response.status_code != 200:
+        logger.error(f"Ошибка получения кода города CDEK. Статус: {response.status_code}, Ответ: {response.text}")
+        # Ошибка API — не «город не найден»: передается исключением, 5xx учитывает цепь
+        response.raise_for_status()
+        return None
+
+    data = response.json()
+    logger.info("Ответ поиска города CDEK: %s", data, extra=PAYLOAD)
+    if isinstance(data, list) and data:
+        return data[0]['code']
 
     return None
 
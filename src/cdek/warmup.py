@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+
+from src.database import new_async_session
+from src.cdek.utils import CDEK_CITIES_URL, call_with_cdek_token, normalize_city_name, save_cdek_city_codes
+from src.http_clients import get_http_client, http_clients
+from src.logger import setup_logger
+
+
+logger = setup_logger('cdek.warmup')
+
+WARMUP_PAGE_SIZE = 500
+
+
+async def warm_up_cdek_city_cache(top_n: int, page_size: int = WARMUP_PAGE_SIZE) -> int:
+    """Загружает первые top_n городов из справочника СДЭК в кэш кодов городов."""
+    saved = 0
+    seen = set()
+    client = get_http_client('cdek')
+    size = min(page_size, top_n)
+
+    async def request_page(access_token: str, page: int) -> list[dict]:
+        response = await client.get(
+            CDEK_CITIES_URL,
+            headers={'Authorization': f'Bearer {access_token}'},
+            params={'country_codes': 'RU', 'size': size, 'page': page},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async with new_async_session() as session:
+        page = 0
+        while saved < top_n:
+            cities = await call_with_cdek_token(session, lambda access_token: request_page(access_token, page))
+            if not cities:
+                break
+            cities = cities[:top_n - saved]
+
+            # Для городов-тезок сохраняется первый код из выдачи СДЭК
+            batch = {}
+            for city in cities:
+                city_name = normalize_city_name(city['city'])
+                if city_name not in seen:
+                    seen.add(city_name)
+                    batch[city_name] = city['code']
+
+            await save_cdek_city_codes(session, batch)
+            saved += len(cities)
+            logger.info(f"Прогрев кэша городов CDEK: страница {page}, обработано {saved} городов")
+
+            if len(cities) < size or saved >= top_n:
+                break
+            page += 1
+
+    return len(seen)
+
+
+async def main(top_n: int) -> None:
+    try:
+        cached = await warm_up_cdek_city_cache(top_n)
+        logger.info(f"Прогрев кэша городов CDEK завершен: {cached} уникальных названий")
+    finally:
+        await http_clients.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Прогрев кэша кодов городов СДЭК')
+    parser.add_argument('--top', type=int, default=1000, help='Количество городов для загрузки')
+    args = parser.parse_args()
+    asyncio.run(main(args.top))
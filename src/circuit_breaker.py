@@ -0,0 +1,258 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from src.metrics import metrics
+from src.logger import setup_logger
+
+
+logger = setup_logger('circuit_breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Доля неудачных вызовов в окне, после которой служба считается недоступной
+CIRCUIT_FAILURE_RATE = float(os.getenv('CIRCUIT_FAILURE_RATE', 0.5))
+# Минимальное число вызовов в окне, прежде чем доля неудач начинает учитываться
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 10))
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', 50))
+# Вызов дольше этого порога, в секундах, считается неудачным, даже если вернул результат
+CIRCUIT_SLOW_CALL = float(os.getenv('CIRCUIT_SLOW_CALL', 5))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 30))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', 3))
+
+CONCURRENCY_INITIAL = int(os.getenv('CARRIER_CONCURRENCY_INITIAL', 20))
+CONCURRENCY_MIN = int(os.getenv('CARRIER_CONCURRENCY_MIN', 2))
+CONCURRENCY_MAX = int(os.getenv('CARRIER_CONCURRENCY_MAX', 100))
+
+
+class CarrierUnavailable(Exception):
+    """Служба доставки пропущена: цепь разомкнута после серии ошибок или медленных ответов."""
+
+
+def is_carrier_failure(error: BaseException) -> bool:
+    """Сбой самой службы: ошибка соединения, таймаут или ответ 5xx.
+
+    Ошибки запроса (4xx, неверные данные посылки, неизвестный город) о состоянии службы
+    не говорят и в цепи не учитываются.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+
+
+class CircuitBreaker:
+    """Состояние доступности службы доставки: closed -> open -> half_open -> closed.
+
+    В closed учитываются исходы последних window вызовов. Когда доля неудач (ошибок
+    и медленных ответов) достигает failure_rate, цепь размыкается и вызовы сразу
+    отклоняются. Через open_seconds пропускается не больше half_open_calls пробных
+    вызовов: если все успешны, цепь замыкается, при первой неудаче снова размыкается.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window: int = CIRCUIT_WINDOW,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"Цепь {self.name}: {self.state} -> {state}")
+        metrics.increment(f'circuit.{self.name}.{state}')
+        self.state = state
+        self._outcomes.clear()
+        self._trials = 0
+        self._trial_successes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                return False
+            self._trials += 1
+
+        return True
+
+    def cancel(self) -> None:
+        """Пропущенный вызов отменен до получения результата: пробный слот освобождается."""
+        if self.state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def record(self, success: bool) -> None:
+        if self.state == HALF_OPEN:
+            if not success:
+                self._set_state(OPEN)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                self._set_state(CLOSED)
+            return
+
+        if self.state == OPEN:
+            # Вызов, начатый до размыкания цепи
+            return
+
+        self._outcomes.append(success)
+        if len(self._outcomes) < self.min_calls:
+            return
+        failures = self._outcomes.count(False)
+        if failures / len(self._outcomes) >= self.failure_rate:
+            self._set_state(OPEN)
+
+
+class AIMDLimiter:
+    """Адаптивное ограничение числа одновременных запросов к службе доставки.
+
+    Успешный быстрый ответ увеличивает лимит на 1/limit (примерно +1 за полный
+    цикл запросов), ошибка или медленный ответ уменьшает его вдвое. Сверх лимита
+    вызовы ждут освобождения места в порядке очереди.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = CONCURRENCY_INITIAL,
+        min_limit: int = CONCURRENCY_MIN,
+        max_limit: int = CONCURRENCY_MAX,
+        backoff: float = 0.5,
+    ):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        metrics.increment(f'limiter.{self.name}.queued')
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Место успели выделить до отмены — возвращаем его
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, success: Optional[bool]) -> None:
+        """success=None — вызов отменен, лимит не меняется."""
+        if success is True:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif success is False:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class CarrierGuard:
+    """Цепь и ограничитель одновременных запросов одной службы доставки."""
+
+    def __init__(self, name: str, slow_call: float = CIRCUIT_SLOW_CALL):
+        self.name = name
+        self.slow_call = slow_call
+        self.breaker = CircuitBreaker(name)
+        self.limiter = AIMDLimiter(name)
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[None]:
+        if not self.breaker.allow():
+            metrics.increment(f'circuit.{self.name}.rejected')
+            raise CarrierUnavailable(f"Служба {self.name} временно недоступна")
+
+        try:
+            await self.limiter.acquire()
+        except asyncio.CancelledError:
+            self.breaker.cancel()
+            raise
+
+        started = time.monotonic()
+        success: Optional[bool] = False
+        try:
+            yield
+            success = time.monotonic() - started < self.slow_call
+            if not success:
+                metrics.increment(f'circuit.{self.name}.slow_calls')
+        except asyncio.CancelledError:
+            # Отмена (клиент ушел или расчет вышел за бюджет) не говорит о состоянии службы
+            success = None
+            raise
+        except Exception as e:
+            if not is_carrier_failure(e):
+                success = None
+            raise
+        finally:
+            if success is None:
+                self.breaker.cancel()
+            else:
+                self.breaker.record(success)
+            self.limiter.release(success)
+
+    def snapshot(self) -> dict:
+        return {
+            'state': self.breaker.state,
+            'concurrency_limit': int(self.limiter.limit),
+            'in_flight': self.limiter.in_flight,
+        }
+
+
+class CarrierGuards:
+    """Цепи и ограничители по службам доставки, создаются при первом обращении."""
+
+    def __init__(self):
+        self._guards: dict[str, CarrierGuard] = {}
+
+    def get(self, name: str) -> CarrierGuard:
+        guard = self._guards.get(name)
+        if guard is None:
+            guard = CarrierGuard(name)
+            self._guards[name] = guard
+            metrics.register_gauge(f'circuit.{name}', guard.snapshot)
+        return guard
+
+
+carrier_guards = CarrierGuards()
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select
+
+from src.database import SessionDep
+from src.models import DeliveryAPICredentials
+from src.logger import setup_logger
+
+
+logger = setup_logger('credentials')
+
+# Токен считается истекшим за минуту до expires_at, чтобы не отправлять почти просроченный токен
+TOKEN_REFRESH_MARGIN = timedelta(seconds=60)
+
+TokenRefresher = Callable[[DeliveryAPICredentials], Awaitable[tuple[str, datetime]]]
+
+
+class CredentialManager:
+    """Хранит токен службы доставки в памяти процесса.
+
+    Пока токен действителен, база данных не запрашивается. Одновременные
+    обновления объединяются под одной блокировкой: к OAuth службы уходит
+    один запрос, и результат один раз записывается в delivery_api_credentials.
+    Если refresh не задан (статический ключ), токен перечитывается из базы раз в reload_interval.
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        display_name: str,
+        refresh: Optional[TokenRefresher] = None,
+        reload_interval: timedelta = timedelta(minutes=10),
+    ):
+        self.service_name = service_name
+        self.display_name = display_name
+        self._refresh = refresh
+        self._reload_interval = reload_interval
+        self._token: Optional[str] = None
+        self._valid_until: Optional[datetime] = None
+        # Токен, отклоненный службой раньше expires_at: из базы он больше не берется
+        self._rejected: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    def _cached_token(self) -> Optional[str]:
+        if self._token and self._valid_until and self._valid_until > datetime.now(timezone.utc):
+            return self._token
+        return None
+
+    def invalidate(self, token: str) -> None:
+        """Служба отклонила token (ответ 401): следующий get_token получит новый токен.
+
+        Если токен уже обновил другой запрос, текущий токен не сбрасывается.
+        """
+        self._rejected = token
+        if self._token == token:
+            self._token = None
+            self._valid_until = None
+
+    async def get_token(self, session: SessionDep) -> str:
+        token = self._cached_token()
+        if token:
+            return token
+
+        async with self._lock:
+            # Пока ждали блокировку, токен мог обновить другой запрос
+            token = self._cached_token()
+            if token:
+                return token
+            return await self._load(session)
+
+    async def _load(self, session: SessionDep) -> str:
+        now = datetime.now(timezone.utc)
+
+        result = await session.execute(
+            select(DeliveryAPICredentials).where(DeliveryAPICredentials.service_name == self.service_name)
+        )
+        creds = result.scalars().first()
+
+        if self._refresh is None:
+            if not creds or not creds.token:
+                raise ValueError(f"Токен для {self.display_name} не найден в базе данных")
+            self._token = creds.token
+            self._valid_until = now + self._reload_interval
+            return self._token
+
+        # Токен мог обновить другой процесс
+        if (
+            creds and creds.token and creds.token != self._rejected
+            and creds.expires_at and creds.expires_at - TOKEN_REFRESH_MARGIN > now
+        ):
+            self._token = creds.token
+            self._valid_until = creds.expires_at - TOKEN_REFRESH_MARGIN
+            return self._token
+
+        if not creds:
+            creds = DeliveryAPICredentials(
+                service_name=self.service_name,
+                client_login='',
+                client_secret='',
+            )
+            session.add(creds)
+
+        logger.info(f"Обновление токена {self.display_name}")
+        token, expires_at = await self._refresh(creds)
+
+        creds.token = token
+        creds.expires_at = expires_at
+        await session.commit()
+
+        self._token = token
+        self._valid_until = expires_at - TOKEN_REFRESH_MARGIN
+        return token
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+from typing import Optional
+
+from src.logger import setup_logger
+
+
+logger = setup_logger('dellin.terminals')
+
+SNAPSHOT_VERSION = 1
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+terminals_path = os.path.join(current_dir, 'terminals_v3.json')
+snapshot_path = os.path.join(current_dir, 'terminals_v3.snapshot')
+
+def load_terminals(file_path: str) -> dict:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"Файл {file_path} не является валидным JSON-словарём")
+            return data
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Файл {file_path} не найден")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Ошибка парсинга JSON в файле {file_path}: {str(e)}")
+
+def source_digest(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class TerminalIndex:
+    """Справочник терминалов, проиндексированный по коду города.
+
+    Для каждого города заранее выбирается первый терминал, выдающий груз (giveoutCargo),
+    и первый такой терминал с поддержкой экспресс-доставки.
+    """
+
+    def __init__(self, terminals: dict[str, dict[str, Optional[dict]]]):
+        self._terminals = terminals
+
+    @classmethod
+    def from_terminals_data(cls, terminals_data: dict) -> 'TerminalIndex':
+        if not isinstance(terminals_data, dict):
+            raise TypeError(f"terminals_data должен быть словарем, получен {type(terminals_data)}")
+
+        terminals: dict[str, dict[str, Optional[dict]]] = {}
+        for city in terminals_data.get('city', []):
+            code = city.get('code')
+            # При повторении кода города используется первая запись, как и при линейном поиске
+            if code in terminals:
+                continue
+
+            best = {'default': None, 'express': None}
+            for terminal in city.get('terminals', {}).get('terminal', []):
+                if not terminal.get('giveoutCargo', True):
+                    continue
+                if best['default'] is None:
+                    best['default'] = {'id': terminal.get('id'), 'name': terminal.get('name')}
+                if best['express'] is None and terminal.get('express', False):
+                    best['express'] = {'id': terminal.get('id'), 'name': terminal.get('name')}
+                if best['default'] is not None and best['express'] is not None:
+                    break
+
+            terminals[code] = best
+
+        return cls(terminals)
+
+    def to_mapping(self) -> dict[str, dict[str, Optional[dict]]]:
+        return self._terminals
+
+    def __len__(self) -> int:
+        return len(self._terminals)
+
+    def __contains__(self, city_code: str) -> bool:
+        return city_code in self._terminals
+
+    def get(self, city_code: str, delivery_mode: str) -> Optional[dict]:
+        best = self._terminals.get(city_code)
+        if best is None:
+            return None
+        return best['express'] if delivery_mode == 'express' else best['default']
+
+def build_snapshot(source_path: str = terminals_path, target_path: str = snapshot_path) -> TerminalIndex:
+    index = TerminalIndex.from_terminals_data(load_terminals(source_path))
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'source_sha256': source_digest(source_path),
+        'terminals': index.to_mapping(),
+    }
+
+    tmp_path = f"{target_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, target_path)
+
+    logger.info(f"Снимок справочника терминалов сохранен в {target_path}: {len(index)} городов")
+    return index
+
+def load_snapshot(source_path: str = terminals_path, target_path: str = snapshot_path) -> Optional[TerminalIndex]:
+    try:
+        with open(target_path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        logger.info(f"Снимок справочника терминалов {target_path} не найден")
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать снимок справочника терминалов {target_path}: {str(e)}")
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Снимок справочника терминалов {target_path} имеет неподдерживаемую версию")
+        return None
+
+    if snapshot.get('source_sha256') != source_digest(source_path):
+        logger.warning(f"Снимок справочника терминалов {target_path} устарел относительно {source_path}")
+        return None
+
+    return TerminalIndex(snapshot['terminals'])
+
+_terminal_index: Optional[TerminalIndex] = None
+
+def get_terminal_index() -> TerminalIndex:
+    global _terminal_index
+
+    if _terminal_index is None:
+        index = load_snapshot()
+        if index is None:
+            logger.info(f"Построение справочника терминалов из {terminals_path}")
+            index = TerminalIndex.from_terminals_data(load_terminals(terminals_path))
+        _terminal_index = index
+
+    return _terminal_index
+
+async def preload_terminal_index() -> TerminalIndex:
+    """Строит справочник терминалов при запуске приложения в отдельном потоке.
+
+    Проверка хэша, чтение снимка или разбор JSON не выполняются в цикле событий при первом запросе.
+    """
+    return await asyncio.to_thread(get_terminal_index)
+
+if __name__ == '__main__':
+    build_snapshot()
@@ -1,16 +1,25 @@
-from datetime import datetime, timedelta
-import httpx
-import json
+import asyncio
 import os
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
 
-from src.models import DeliveryAPICredentials
+from src.models import DellinCityCache
 from src.database import SessionDep
 from src.calculator.schemas import DeliveryPackage
+from src.calculator.packages import summarize_packages
 from src.pecom.utils import clean_address_with_dadata
-from src.logger import setup_logger
+from src.dellin.terminals import get_terminal_index
+from src.http_clients import get_http_client
+from src.credentials import CredentialManager
+from src.cache import TTLCache, MISSING
+from src.singleflight import single_flight
+from src.circuit_breaker import is_carrier_failure
+from src.metrics import metrics
+from src.logger import setup_logger, PAYLOAD
 
 
 logger = setup_logger('dellin')
@@ -19,86 +28,172 @@ AVAILABLE_DELIVERY_TYPE = ['auto', 'express', 'avia']
 
 DELLIN_BASE_URL = 'https://www.dellin.ru'
 DELLIN_LOGO = 'https://www.ph4.ru/DL/LOGO/d/dellin__.gif'
-
-current_dir = os.path.dirname(os.path.abspath(__file__))
-terminals_path = os.path.join(current_dir, 'terminals_v3.json')
-
-def load_terminals(file_path: str) -> dict:
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if not isinstance(data, dict):
-                raise ValueError(f"Файл {file_path} не является валидным JSON-словарём")
-            return data
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Файл {file_path} не найден")
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Ошибка парсинга JSON в файле {file_path}: {str(e)}")
-
-def get_terminal_id(city_code: str, terminals_data: dict, delivery_mode: str) -> Optional[str]:
-    if not isinstance(terminals_data, dict):
-        raise TypeError(f"terminals_data должен быть словарем, получен {type(terminals_data)}")
-    
-    for city in terminals_data.get('city', []):
-        if city.get('code') == city_code:
-            terminals = city.get('terminals', {}).get('terminal', [])
-            for terminal in terminals:
-                if not terminal.get('giveoutCargo', True):
-                    continue
-                if delivery_mode == 'express':
-                    if terminal.get('express', False):
-                        print(f"Выбран терминал для {city_code} и {delivery_mode}: {terminal.get('id')} ({terminal.get('name')})")
-                        return terminal.get('id')
-                else:
-                    print(f"Выбран терминал для {city_code} и {delivery_mode}: {terminal.get('id')} ({terminal.get('name')})")
-                    return terminal.get('id')
-            print(f"Терминал для города с кодом {city_code} и типом доставки {delivery_mode} не найден")
-            return None
-    print(f"Город с кодом {city_code} не найден в справочнике")
-    return None
-
-TERMINALS_DATA = load_terminals(terminals_path)
-print(f"TERMINALS_DATA: {TERMINALS_DATA}, type: {type(TERMINALS_DATA)}")
+DELLIN_CALC_URL = 'https://api.dellin.ru/v2/calculator.json'
+# Ограничение времени расчета одного типа доставки, в секундах: медленный тип не задерживает остальные.
+# Должно быть меньше бюджета Деловых Линий (DELLIN_BUDGET, CALCULATE_BUDGET), иначе вместо
+# частичного результата по успевшим типам служба целиком попадет в timed_out
+DELLIN_MODE_TIMEOUT = float(os.getenv('DELLIN_MODE_TIMEOUT', 6))
+DELLIN_CITY_CACHE_SIZE = 10000
+DELLIN_CITY_CACHE_TTL = 7 * 24 * 60 * 60
+# Негативные записи (город не найден) живут меньше, чтобы новые города подхватывались быстрее
+DELLIN_CITY_NEGATIVE_TTL = 60 * 60
+
+city_code_cache = TTLCache(maxsize=DELLIN_CITY_CACHE_SIZE)
+
+def get_terminal_id(city_code: str, delivery_mode: str) -> Optional[str]:
+    terminal_index = get_terminal_index()
+    if city_code not in terminal_index:
+        logger.warning("Город с кодом %s не найден в справочнике", city_code)
+        return None
+
+    terminal = terminal_index.get(city_code, delivery_mode)
+    if terminal is None:
+        logger.warning("Терминал для города с кодом %s и типом доставки %s не найден", city_code, delivery_mode)
+        return None
+
+    logger.debug("Выбран терминал для %s и %s: %s (%s)", city_code, delivery_mode, terminal['id'], terminal['name'])
+    return terminal['id']
+
+dellin_credentials = CredentialManager('dellin', 'Деловых Линий')
 
 async def get_dellin_token(session: SessionDep) -> str:
-    result = await session.execute(
-        select(DeliveryAPICredentials)
-        .where(DeliveryAPICredentials.service_name == 'dellin')
+    return await dellin_credentials.get_token(session)
+
+async def save_dellin_city_code(session: SessionDep, city_name: str, city_code: Optional[str]) -> None:
+    statement = insert(DellinCityCache).values(city_name=city_name, city_code=city_code)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[DellinCityCache.city_name],
+            set_={'city_code': statement.excluded.city_code, 'updated_at': func.now()},
+        )
     )
-    creds = result.scalars().first()
+    await session.commit()
 
-    if not creds or not creds.token:
-        raise ValueError("Токен для Деловых Линий не найден в базе данных")
+    ttl = DELLIN_CITY_CACHE_TTL if city_code is not None else DELLIN_CITY_NEGATIVE_TTL
+    city_code_cache.set(city_name, city_code, ttl=ttl)
 
-    return creds.token
+@single_flight('dellin.kladr', key=lambda appkey, city_name: city_name.strip().lower())
+async def request_dellin_kladr(appkey: str, city_name: str) -> Optional[list[dict]]:
+    """Ищет город в справочнике КЛАДР. Пустой список — город не найден.
 
-async def get_dellin_city_code(session: SessionDep, city_name: str) -> str:
+    Ответы 4xx и 5xx передаются исключением httpx.HTTPStatusError (5xx учитывает цепь),
+    None — прочие неожиданные ответы.
+    """
+    logger.info(f"Запрос кода города Деловых Линий. Город: {city_name}")
+    client = get_http_client('dellin')
+    response = await client.post(
+        'https://api.dellin.ru/v2/public/kladr.json',
+        json={'appkey': appkey, 'q': city_name}
+    )
+
+    if response.status_code != 200:
+        logger.error(f"Ошибка получения кода города Деловых Линий. Статус: {response.status_code}, Ответ: {response.text}")
+        response.raise_for_status()
+        return None
+
+    data = response.json()
+    logger.info("Ответ поиска города Деловых Линий: %s", data, extra=PAYLOAD)
+    return data.get('cities', [])
+
+async def get_dellin_city_code(session: SessionDep, city_name: str) -> Optional[str]:
+    key = city_name.strip().lower()
+
+    city_code = city_code_cache.get(key)
+    if city_code is not MISSING:
+        metrics.increment('dellin.city_cache.hits')
+        metrics.increment('dellin.city_cache.upstream_saved')
+        return city_code
+
+    cached = (await session.execute(
+        select(DellinCityCache.city_code, DellinCityCache.updated_at)
+        .where(DellinCityCache.city_name == key)
+    )).first()
+    if cached is not None:
+        ttl = DELLIN_CITY_CACHE_TTL if cached.city_code is not None else DELLIN_CITY_NEGATIVE_TTL
+        age = (datetime.now(timezone.utc) - cached.updated_at).total_seconds()
+        if age < ttl:
+            logger.info(f"Найден кэшированный код города Деловых Линий: {city_name} -> {cached.city_code}")
+            metrics.increment('dellin.city_cache.hits')
+            metrics.increment('dellin.city_cache.db_hits')
+            metrics.increment('dellin.city_cache.upstream_saved')
+            city_code_cache.set(key, cached.city_code, ttl=ttl - age)
+            return cached.city_code
+
+    metrics.increment('dellin.city_cache.misses')
     appkey = await get_dellin_token(session)
 
-    logger.info(f"Запрос кода города Деловых Линий. Город: {city_name}")
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            'https://api.dellin.ru/v2/public/kladr.json',
-            json={'appkey': appkey, 'q': city_name}
+    cities = await request_dellin_kladr(appkey, city_name)
+    if cities is None:
+        return None
+    if not cities:
+        logger.error(f"Город '{city_name}' не найден в API Деловых Линий")
+        await save_dellin_city_code(session, key, None)
+        return None
+
+    city_code = cities[0].get('code')
+    await save_dellin_city_code(session, key, city_code)
+    return city_code
+
+@single_flight('dellin.tariff')
+async def request_dellin_tariff(delivery_mode: str, payload: dict) -> Optional[dict]:
+    logger.info("Запрос расчета стоимости Деловых Линий (%s). Параметры: %s", delivery_mode, payload, extra=PAYLOAD)
+    client = get_http_client('dellin')
+    started = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(
+            client.post(DELLIN_CALC_URL, json=payload),
+            timeout=DELLIN_MODE_TIMEOUT,
         )
-        
-        if response.status_code != 200:
-            logger.error(f"Ошибка получения кода города Деловых Линий. Статус: {response.status_code}, Ответ: {response.text}")
-            return None
-        
+        response.raise_for_status()
+
         data = response.json()
-        logger.info(f"Ответ поиска города Деловых Линий: {data}")
-        cities = data.get('cities', [])
-        if not cities:
-            logger.error(f"Город '{city_name}' не найден в API Деловых Линий")
+        logger.info("Ответ расчета стоимости Деловых Линий (%s): %s", delivery_mode, data, extra=PAYLOAD)
+
+        # Извлекаем данные из ответа
+        if data.get('metadata', {}).get('status') != 200:
+            logger.error(f"Ошибка API Деловых Линий для {delivery_mode}: {data}")
             return None
-        
-        return cities[0].get('code')
+
+        response_data = data.get('data', {})
+
+        # Стоимость доставки
+        price = response_data.get('price', 0)
+        if not price:
+            price = response_data.get(delivery_mode, {}).get('price', 0)
+            if not price:
+                logger.error(f"Не удалось получить стоимость доставки для {delivery_mode}")
+                return None
+
+        # Сроки доставки
+        period_min = response_data.get('period', {}).get('min', 0)
+        period_max = response_data.get('period', {}).get('max', 0)
+
+        return {
+            'delivery_sum': price,
+            'period_min': period_min,
+            'period_max': period_max,
+            'service_name': f'Деловые Линии ({delivery_mode})',
+            'service_url': DELLIN_BASE_URL,
+            'service_logo': DELLIN_LOGO,
+        }
+
+    except asyncio.TimeoutError:
+        logger.error(f"Превышено время ожидания расчета Деловых Линий ({delivery_mode}): {DELLIN_MODE_TIMEOUT} с")
+        metrics.increment(f'dellin.calculator.{delivery_mode}.timeouts')
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при расчете стоимости Деловых Линий ({delivery_mode}): {str(e)}")
+        # Сбой службы передается дальше, чтобы его учла цепь
+        if is_carrier_failure(e):
+            raise
+        return None
+    finally:
+        metrics.observe(f'dellin.calculator.{delivery_mode}', time.perf_counter() - started)
 
 async def calculate_dellin_delivery(
     session: SessionDep,
-    from_location: str,
-    to_location: str,
+    from_city_code: str,
+    to_city_code: str,
     packages: list,
     delivery_type: int,
     date: str
@@ -108,14 +203,7 @@ async def calculate_dellin_delivery(
 
     appkey = await get_dellin_token(session)
 
-    # Используем оригинальные названия городов
-    from_city_code = await get_dellin_city_code(session, from_location)
-    to_city_code = await get_dellin_city_code(session, to_location)
-
-    if not from_city_code or not to_city_code:
-        raise ValueError(f"Не удалось определить коды городов: {from_location} -> {to_city_code}")
-
-    package = packages[0]
+    cargo = summarize_packages(packages)
 
     # Преобразуем строку даты в объект datetime
     try:
@@ -130,101 +218,66 @@ async def calculate_dellin_delivery(
     derival_variant = 'terminal' if delivery_type in [1, 2] else 'address'
     arrival_variant = 'terminal' if delivery_type in [1, 3] else 'address'
 
-    results = []
-
-    # Выполняем запрос для каждого доступного типа доставки
-    async with httpx.AsyncClient() as client:
-        for delivery_mode in AVAILABLE_DELIVERY_TYPE:
-            # Получаем terminalID для текущего типа доставки
-            from_terminal_id = get_terminal_id(from_city_code, TERMINALS_DATA, delivery_mode) if derival_variant == 'terminal' else None
-            to_terminal_id = get_terminal_id(to_city_code, TERMINALS_DATA, delivery_mode) if arrival_variant == 'terminal' else None
-
-            if not from_terminal_id or not to_terminal_id:
-                logger.warning(f"Пропускаем {delivery_mode}, так как не найдены подходящие терминалы")
-                continue
-
-            # Формируем payload
-            payload = {
-                'appkey': appkey,
-                'delivery': {
-                    'deliveryType': {
-                        'type': delivery_mode
-                    },
-                    'derival': {
-                        'produceDate': produce_date.strftime('%Y-%m-%d'),
-                        'variant': derival_variant,
-                        'terminalID': from_terminal_id
-                    },
-                    'arrival': {
-                        'variant': arrival_variant,
-                        'terminalID': to_terminal_id
-                    }
+    requests = []
+
+    # Формируем запрос для каждого доступного типа доставки
+    for delivery_mode in AVAILABLE_DELIVERY_TYPE:
+        # Получаем terminalID для текущего типа доставки
+        from_terminal_id = get_terminal_id(from_city_code, delivery_mode) if derival_variant == 'terminal' else None
+        to_terminal_id = get_terminal_id(to_city_code, delivery_mode) if arrival_variant == 'terminal' else None
+
+        if not from_terminal_id or not to_terminal_id:
+            logger.warning(f"Пропускаем {delivery_mode}, так как не найдены подходящие терминалы")
+            continue
+
+        # Формируем payload
+        payload = {
+            'appkey': appkey,
+            'delivery': {
+                'deliveryType': {
+                    'type': delivery_mode
                 },
-                'cargo': {
-                    'quantity': 1,
-                    'length': package.length / 100,
-                    'width': package.width / 100,
-                    'height': package.height / 100,
-                    'weight': package.weight / 1000,
-                    'totalVolume': (package.length / 100) * (package.width / 100) * (package.height / 100),
-                    'totalWeight': package.weight / 1000,
-                    'insurance': {
-                        'statedValue': 1000.0,
-                        'term': True
-                    }
+                'derival': {
+                    'produceDate': produce_date.strftime('%Y-%m-%d'),
+                    'variant': derival_variant,
+                    'terminalID': from_terminal_id
                 },
-                'payment': {
-                    'type': 'cash',
-                    'paymentCity': from_city_code
+                'arrival': {
+                    'variant': arrival_variant,
+                    'terminalID': to_terminal_id
                 }
+            },
+            'cargo': {
+                'quantity': cargo.quantity,
+                'length': cargo.largest_place.length,
+                'width': cargo.largest_place.width,
+                'height': cargo.largest_place.height,
+                'weight': cargo.max_weight,
+                'totalVolume': cargo.total_volume,
+                'totalWeight': cargo.total_weight,
+                'insurance': {
+                    'statedValue': 1000.0,
+                    'term': True
+                }
+            },
+            'payment': {
+                'type': 'cash',
+                'paymentCity': from_city_code
             }
+        }
+
+        requests.append(request_dellin_tariff(delivery_mode, payload))
 
-            logger.info(f"Запрос расчета стоимости Деловых Линий ({delivery_mode}). Параметры: {payload}")
-            try:
-                response = await client.post(
-                    'https://api.dellin.ru/v2/calculator.json',
-                    json=payload
-                )
-                response.raise_for_status()
-
-                data = response.json()
-                logger.info(f"Ответ расчета стоимости Деловых Линий ({delivery_mode}): {data}")
-
-                # Извлекаем данные из ответа
-                if data.get('metadata', {}).get('status') != 200:
-                    logger.error(f"Ошибка API Деловых Линий для {delivery_mode}: {data}")
-                    continue
-
-                response_data = data.get('data', {})
-                
-                # Стоимость доставки
-                price = response_data.get('price', 0)
-                if not price:
-                    price = response_data.get(delivery_mode, {}).get('price', 0)
-                    if not price:
-                        logger.error(f"Не удалось получить стоимость доставки для {delivery_mode}")
-                        continue
-
-                # Сроки доставки
-                period_min = response_data.get('period', {}).get('min', 0)
-                period_max = response_data.get('period', {}).get('max', 0)
-
-                results.append({
-                    'delivery_sum': price,
-                    'period_min': period_min,
-                    'period_max': period_max,
-                    'service_name': f'Деловые Линии ({delivery_mode})',
-                    'service_url': DELLIN_BASE_URL,
-                    'service_logo': DELLIN_LOGO,
-                })
-
-            except Exception as e:
-                logger.error(f"Ошибка при расчете стоимости Деловых Линий ({delivery_mode}): {str(e)}")
-                continue
+    # Тарифы по всем типам доставки запрашиваются параллельно, недоступные типы пропускаются
+    responses = await asyncio.gather(*requests, return_exceptions=True)
+    results = [response for response in responses if isinstance(response, dict)]
 
     if not results:
         logger.error("Не удалось получить данные о стоимости доставки от Деловых Линий")
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
         raise ValueError("Не удалось получить данные о стоимости доставки от Деловых Линий")
 
-    logger.info(f"Успешно получены результаты расчета Деловых Линий: {results}")
+    logger.info("Успешно получены результаты расчета Деловых Линий: %s", results, extra=PAYLOAD)
     return results
\ No newline at end of file
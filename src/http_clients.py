@@ -0,0 +1,75 @@
+import os
+
+import httpx
+
+from src.logger import setup_logger
+
+
+logger = setup_logger('http_clients')
+
+# Таймауты отдельных этапов запроса (подключение, чтение, запись, ожидание соединения из пула), в секундах.
+# Меньше DELLIN_MODE_TIMEOUT и бюджетов расчета: зависший запрос завершается ошибкой httpx,
+# которую учитывает цепь, раньше, чем истекают ограничения уровнем выше
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 5))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_CLIENT_TIMEOUT = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+# Отдельный пул соединений на каждый внешний хост.
+# HTTP/2 включен только для HTTPS-хостов, поддерживающих его.
+HTTP_CLIENT_SETTINGS = {
+    'cdek': {
+        'http2': True,
+        'timeout': HTTP_CLIENT_TIMEOUT,
+        'limits': httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+    },
+    'dellin': {
+        'http2': True,
+        'timeout': HTTP_CLIENT_TIMEOUT,
+        'limits': httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+    },
+    'dadata': {
+        'http2': True,
+        'timeout': HTTP_CLIENT_TIMEOUT,
+        'limits': httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+    },
+    'pecom': {
+        'http2': True,
+        'timeout': HTTP_CLIENT_TIMEOUT,
+        'limits': httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60),
+    },
+    # calc.pecom.ru доступен только по HTTP/1.1 без TLS
+    'pecom_calc': {
+        'http2': False,
+        'timeout': HTTP_CLIENT_TIMEOUT,
+        'limits': httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30),
+    },
+}
+
+
+class HTTPClientRegistry:
+    def __init__(self, settings: dict[str, dict]):
+        self._settings = settings
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            if name not in self._settings:
+                raise KeyError(f"Неизвестный HTTP-клиент: {name}")
+            client = httpx.AsyncClient(**self._settings[name])
+            self._clients[name] = client
+            logger.info(f"Создан пул HTTP-соединений для {name}")
+        return client
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for name, client in clients:
+            await client.aclose()
+            logger.info(f"Закрыт пул HTTP-соединений для {name}")
+
+
+http_clients = HTTPClientRegistry(HTTP_CLIENT_SETTINGS)
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    return http_clients.get(name)
@@ -1,39 +1,147 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime, timezone
+from typing import Optional
 
 
-def setup_logger(name: str) -> logging.Logger:
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs'))
+# json — по объекту JSON на строку, text — прежний текстовый формат
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+# Доля записываемых дампов запросов и ответов служб (записи с extra=PAYLOAD)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 1.0))
+# Доли для отдельных логгеров: "pecom=0.1,dellin=0.05"; действуют и на дочерние логгеры
+LOG_PAYLOAD_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (
+        item.split('=', 1) for item in os.getenv('LOG_PAYLOAD_SAMPLE_RATES', '').split(',') if '=' in item
+    )
+}
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+# Отметка записи с дампом запроса или ответа: logger.info("Ответ: %s", data, extra=PAYLOAD)
+PAYLOAD = {'payload': True}
 
-    if logger.handlers:
-        return logger
+_STANDARD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'payload'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        # Поля, переданные через extra
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PayloadSampler(logging.Filter):
+    """Пропускает только долю rate записей с дампами; остальные записи не затрагивает."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'payload', False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class LazyQueueHandler(QueueHandler):
+    """Передает запись в очередь без форматирования.
+
+    Стандартный QueueHandler форматирует сообщение в вызывающем потоке, то есть в
+    цикле событий. Здесь msg % args и сериализация выполняются в потоке QueueListener,
+    поэтому в аргументы логгера нельзя передавать объекты, которые потом изменяются.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def payload_sample_rate(name: str) -> float:
+    # Ближайший заданный предок: для 'pecom.towns' подходит и 'pecom'
+    while name:
+        if name in LOG_PAYLOAD_SAMPLE_RATES:
+            return LOG_PAYLOAD_SAMPLE_RATES[name]
+        name = name.rpartition('.')[0]
+    return LOG_PAYLOAD_SAMPLE_RATE
 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
 
-    log_file = os.path.join(log_dir, 'app.log')
+def create_formatter() -> logging.Formatter:
+    if LOG_FORMAT == 'text':
+        return logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    return JsonFormatter()
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_queue_handler = LazyQueueHandler(_log_queue)
+_listener: Optional[QueueListener] = None
+
+
+def start_listener() -> QueueListener:
+    """Запускает поток, который пишет записи из очереди в файл и консоль."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    formatter = create_formatter()
+
+    log_file = os.path.join(LOG_DIR, 'app.log')
     file_handler = RotatingFileHandler(
         log_file,
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5,
         encoding='utf-8'
     )
-    file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
 
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    _listener = QueueListener(_log_queue, file_handler, console_handler)
+    _listener.start()
+    # При завершении процесса записи, оставшиеся в очереди, дописываются
+    atexit.register(stop_listener)
+    return _listener
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+
+    if _queue_handler in logger.handlers:
+        return logger
+
+    start_listener()
+    logger.addHandler(_queue_handler)
+    logger.addFilter(PayloadSampler(payload_sample_rate(name)))
+    # У каждого логгера свой обработчик: без этого запись дочернего логгера
+    # ('pecom.towns') попадала бы в лог второй раз через обработчик родителя ('pecom')
+    logger.propagate = False
 
-    return logger 
\ No newline at end of file
+    return logger
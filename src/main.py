@@ -1,12 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.users.router import main_router
 from src.reviews.router import review_router
 from src.calculator.router import calculator_router
+from src.metrics import metrics_router
+from src.users.utils import get_current_admin
+from src.http_clients import http_clients
+from src.users.passwords import password_service
+from src.pecom.towns import pecom_towns
+from src.dellin.terminals import preload_terminal_index
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await preload_terminal_index()
+    pecom_towns.start()
+    yield
+    await pecom_towns.stop()
+    await http_clients.aclose()
+    password_service.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,4 +35,6 @@ app.add_middleware(
 
 app.include_router(main_router)
 app.include_router(review_router)
-app.include_router(calculator_router)
\ No newline at end of file
+app.include_router(calculator_router)
+# Метрики раскрывают состояние служб и нагрузку, доступны только администраторам
+app.include_router(metrics_router, dependencies=[Depends(get_current_admin)])
\ No newline at end of file
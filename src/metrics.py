@@ -0,0 +1,55 @@
+from collections import defaultdict
+from typing import Any, Callable
+
+from fastapi import APIRouter
+
+
+class Metrics:
+    """Счетчики и замеры длительности в памяти процесса."""
+
+    def __init__(self):
+        self._counters: defaultdict[str, int] = defaultdict(int)
+        self._timings: dict[str, dict[str, float]] = {}
+        self._gauges: dict[str, Callable[[], Any]] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self._counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        timing = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+        timing['count'] += 1
+        timing['sum'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+
+    def register_gauge(self, name: str, read: Callable[[], Any]) -> None:
+        """Текущее значение читается при каждом снимке метрик."""
+        self._gauges[name] = read
+
+    def snapshot(self) -> dict:
+        counters = dict(self._counters)
+
+        # Для пар счетчиков <name>.hits / <name>.misses считаем долю попаданий
+        ratios = {}
+        for name, hits in counters.items():
+            if name.endswith('.hits'):
+                prefix = name[:-len('.hits')]
+                total = hits + counters.get(f'{prefix}.misses', 0)
+                ratios[f'{prefix}.hit_ratio'] = hits / total if total else 0.0
+
+        timings = {
+            name: {**timing, 'avg': timing['sum'] / timing['count'] if timing['count'] else 0.0}
+            for name, timing in self._timings.items()
+        }
+
+        gauges = {name: read() for name, read in self._gauges.items()}
+
+        return {'counters': counters, 'ratios': ratios, 'timings': timings, 'gauges': gauges}
+
+
+metrics = Metrics()
+# Подключается в src/main.py с проверкой токена (get_current_user)
+metrics_router = APIRouter(tags=['metrics'])
+
+@metrics_router.get('/api/v1/metrics')
+async def get_metrics():
+    return metrics.snapshot()
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import Integer, String, Text, TIMESTAMP, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
 
 from src.database import Base
 
@@ -78,4 +79,91 @@ class DadataCache(Base):
     updated_at = mapped_column(
         DateTime(timezone=True), 
         onupdate=func.now()
-    )
\ No newline at end of file
+    )
+
+class CdekCityCache(Base):
+    __tablename__ = "cdek_city_cache"
+
+    id = mapped_column(
+        Integer,
+        primary_key=True,
+        index=True
+    )
+
+    city_name = mapped_column(
+        String,
+        unique=True,
+        index=True
+    )
+
+    city_code = mapped_column(
+        Integer,
+        nullable=False
+    )
+
+    created_at = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+    updated_at = mapped_column(
+        DateTime(timezone=True),
+        onupdate=func.now()
+    )
+
+class DellinCityCache(Base):
+    __tablename__ = "dellin_city_cache"
+
+    id = mapped_column(
+        Integer,
+        primary_key=True,
+        index=True
+    )
+
+    city_name = mapped_column(
+        String,
+        unique=True,
+        index=True
+    )
+
+    # NULL означает, что город не найден в КЛАДР Деловых Линий (негативная запись)
+    city_code = mapped_column(
+        String,
+        nullable=True
+    )
+
+    created_at = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+    updated_at = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+
+class QuoteCacheEntry(Base):
+    __tablename__ = "quote_cache"
+
+    key = mapped_column(
+        String(64),
+        primary_key=True
+    )
+
+    payload = mapped_column(
+        JSONB,
+        nullable=False
+    )
+
+    expires_at = mapped_column(
+        DateTime(timezone=True),
+        nullable=False
+    )
+
+    accessed_at = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        index=True
+    )
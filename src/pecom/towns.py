@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+from src.http_clients import get_http_client
+from src.logger import setup_logger
+
+
+logger = setup_logger('pecom.towns')
+
+PECOM_CITIES_URL = "https://pecom.ru/ru/calc/towns.php"
+PECOM_TOWNS_TTL = int(os.getenv('PECOM_TOWNS_TTL', 24 * 60 * 60))
+# Пауза после неудачной загрузки справочника, в секундах: до ее окончания запросы не повторяются
+PECOM_TOWNS_RETRY_DELAY = int(os.getenv('PECOM_TOWNS_RETRY_DELAY', 60))
+
+cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache')
+towns_cache_path = os.path.join(cache_dir, 'pecom_towns.json')
+
+
+def build_towns_index(catalogue: dict) -> dict[str, int]:
+    index = {}
+    for region, cities in catalogue.items():
+        for city_id, city_full_name in cities.items():
+            # При совпадении названий используется первый найденный город, как и при линейном поиске
+            index.setdefault(city_full_name.lower(), int(city_id))
+    return index
+
+
+class PecomTownsDirectory:
+    """Справочник городов ПЭК: название в нижнем регистре -> код города.
+
+    Каталог towns.php загружается один раз, хранится в памяти и на диске
+    и обновляется в фоне по истечении TTL.
+    """
+
+    def __init__(self, url: str, cache_path: str, ttl: int, retry_delay: int):
+        self._url = url
+        self._cache_path = cache_path
+        self._ttl = ttl
+        self._retry_delay = retry_delay
+        self._index: Optional[dict[str, int]] = None
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self._fetched_at > self._ttl
+
+    @property
+    def is_backing_off(self) -> bool:
+        return time.time() - self._failed_at < self._retry_delay
+
+    async def get_city_code(self, city_name: str) -> int:
+        index = await self._get_index()
+        city_id = index.get(city_name.lower())
+        if city_id is None:
+            raise ValueError(f"Код города для {city_name} не найден")
+        return city_id
+
+    async def _get_index(self) -> dict[str, int]:
+        if self._index is None:
+            async with self._lock:
+                if self._index is None:
+                    snapshot = await asyncio.to_thread(self._load_from_disk)
+                    if snapshot is not None:
+                        self._index, self._fetched_at = snapshot
+                    elif self.is_backing_off:
+                        raise RuntimeError("Справочник городов ПЭК недоступен, повторная загрузка отложена")
+                    else:
+                        await self._fetch()
+
+        # После неудачного обновления используется прежний справочник до окончания паузы
+        if self.is_stale and not self.is_backing_off:
+            self._schedule_refresh()
+
+        return self._index
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            try:
+                await self._fetch()
+            except Exception as e:
+                logger.error(f"Не удалось обновить справочник городов ПЭК: {str(e)}")
+
+    async def _fetch(self) -> None:
+        logger.info(f"Загрузка справочника городов ПЭК из {self._url}")
+        client = get_http_client('pecom')
+        try:
+            response = await client.get(self._url)
+            response.raise_for_status()
+            catalogue = response.json()
+            index = await asyncio.to_thread(build_towns_index, catalogue)
+        except Exception:
+            self._failed_at = time.time()
+            raise
+
+        self._index = index
+        self._fetched_at = time.time()
+        logger.info(f"Справочник городов ПЭК обновлен: {len(self._index)} городов")
+        await asyncio.to_thread(self._save_to_disk, catalogue, self._fetched_at)
+
+    def _load_from_disk(self) -> Optional[tuple[dict[str, int], float]]:
+        """Читает сохраненный справочник; выполняется в отдельном потоке."""
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            index = build_towns_index(snapshot['towns'])
+            fetched_at = float(snapshot['fetched_at'])
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.warning(f"Не удалось прочитать сохраненный справочник городов ПЭК {self._cache_path}: {str(e)}")
+            return None
+
+        logger.info(f"Справочник городов ПЭК загружен с диска: {len(index)} городов")
+        return index, fetched_at
+
+    def _save_to_disk(self, catalogue: dict, fetched_at: float) -> None:
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            tmp_path = f"{self._cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': fetched_at, 'towns': catalogue}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить справочник городов ПЭК в {self._cache_path}: {str(e)}")
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self._get_index()
+            except Exception as e:
+                logger.error(f"Не удалось загрузить справочник городов ПЭК: {str(e)}")
+            await asyncio.sleep(self._ttl)
+
+    def start(self) -> None:
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        for task in (self._background_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._background_task = None
+        self._refresh_task = None
+
+
+pecom_towns = PecomTownsDirectory(PECOM_CITIES_URL, towns_cache_path, PECOM_TOWNS_TTL, PECOM_TOWNS_RETRY_DELAY)
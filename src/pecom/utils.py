@@ -1,86 +1,138 @@
-import httpx
-
 import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from src.calculator.schemas import DeliveryPackage
-from sqlalchemy import select
+from src.calculator.packages import summarize_packages
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
 from src.models import DadataCache
 from src.database import SessionDep
-from src.logger import setup_logger
+from src.http_clients import get_http_client
+from src.pecom.towns import pecom_towns
+from src.cache import TTLCache, MISSING
+from src.singleflight import single_flight
+from src.logger import setup_logger, PAYLOAD
 
 PECOM_CALC_URL = "http://calc.pecom.ru/bitrix/components/pecom/calc/ajax.php"
-PECOM_CITIES_URL = "https://pecom.ru/ru/calc/towns.php"
 DADATA_CLEAN_URL = "https://dadata.ru/api/v1/clean/address"
 PECOM_BASE_URL = 'https://pecom.ru'
 PECOM_LOGO = 'https://pecom.ru/local/vue-cli-build/images/logo.svg'
+DADATA_CACHE_TTL = 30 * 24 * 60 * 60
+DADATA_CACHE_SIZE = 10000
+DADATA_BATCH_SIZE = 50
 
 logger = setup_logger('pecom')
 
-async def clean_address_with_dadata(full_address: str, session: SessionDep) -> str:
-    logger.info(f"Получен исходный адрес: {full_address}")
-    
+address_cache = TTLCache(maxsize=DADATA_CACHE_SIZE, ttl=DADATA_CACHE_TTL)
+
+def extract_city(result: dict) -> Optional[str]:
+    return result.get("city") or result.get("region")
+
+async def load_cached_addresses(addresses: list[str], session: SessionDep) -> dict[str, str]:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=DADATA_CACHE_TTL)
     result = await session.execute(
-        select(DadataCache)
-        .where(DadataCache.original_address == full_address)
+        select(DadataCache.original_address, DadataCache.cleaned_city)
+        .where(
+            DadataCache.original_address.in_(addresses),
+            func.coalesce(DadataCache.updated_at, DadataCache.created_at) > cutoff,
+        )
     )
-    cached_result = result.scalar_one_or_none()
-    
-    if cached_result:
-        logger.info(f"Найден кэшированный результат для адреса: {full_address} -> {cached_result.cleaned_city}")
-        return cached_result.cleaned_city
+    return {row.original_address: row.cleaned_city for row in result}
 
-    logger.info(f"Отправка запроса к DaData для адреса: {full_address}")
+@single_flight('dadata.clean', key=lambda addresses: tuple(addresses))
+async def request_dadata(addresses: list[str]) -> dict[str, str]:
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
         "Authorization": f"Token ab806e2870c628d3f2e326bd9883de220f22575b",
         "X-Secret": "410d3e0025682fc490bd8ea9ba671d18a3679b41",
     }
-    payload = [full_address]
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(DADATA_CLEAN_URL, headers=headers, json=payload)
+    cities = {}
+    client = get_http_client('dadata')
+    for start in range(0, len(addresses), DADATA_BATCH_SIZE):
+        chunk = addresses[start:start + DADATA_BATCH_SIZE]
+        logger.info(f"Отправка запроса к DaData для {len(chunk)} адресов: {chunk}")
+        response = await client.post(DADATA_CLEAN_URL, headers=headers, json=chunk)
         response.raise_for_status()
 
-    data = response.json()
-    if not data:
-        logger.error(f"DaData не вернул данные для адреса: {full_address}")
-        raise ValueError(f"DaData не вернул данные для адреса: {full_address}")
-
-    result = data[0]
-    logger.info(f"Получен ответ от DaData: {result}")
-    
-    city = result.get("city")
-    if not city:
-        city = result.get("region")
-        if not city:
-            logger.error(f"Не удалось извлечь город или регион из адреса: {full_address}")
-            raise ValueError(f"Не удалось извлечь город или регион из адреса: {full_address}")
-
-    logger.info(f"Извлечен город: {city} из адреса: {full_address}")
-    
-    cache_entry = DadataCache(
-        original_address=full_address,
-        cleaned_city=city
+        data = response.json()
+        logger.info("Получен ответ от DaData: %s", data, extra=PAYLOAD)
+        # DaData возвращает результаты в порядке адресов запроса
+        for full_address, result in zip(chunk, data or []):
+            city = extract_city(result)
+            if city:
+                cities[full_address] = city
+            else:
+                logger.error(f"Не удалось извлечь город или регион из адреса: {full_address}")
+
+    return cities
+
+async def save_cleaned_addresses(cities: dict[str, str], session: SessionDep) -> None:
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=DADATA_CACHE_TTL)
+    statement = insert(DadataCache).values([
+        {'original_address': full_address, 'cleaned_city': city, 'updated_at': now}
+        for full_address, city in cities.items()
+    ])
+    # Свежую запись, сохраненную параллельным запросом, не трогаем; устаревшую обновляем
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[DadataCache.original_address],
+            set_={'cleaned_city': statement.excluded.cleaned_city, 'updated_at': statement.excluded.updated_at},
+            where=func.coalesce(DadataCache.updated_at, DadataCache.created_at) <= cutoff,
+        )
     )
-    session.add(cache_entry)
     await session.commit()
-    logger.info(f"Результат сохранен в кэш: {full_address} -> {city}")
-    
+
+async def clean_addresses_with_dadata(addresses: list[str], session: SessionDep) -> dict[str, str]:
+    """Определяет города для списка адресов: кэш в памяти, затем таблица dadata_cache, затем один запрос к DaData.
+
+    Адреса, для которых не удалось определить город, в результат не попадают.
+    """
+    cities = {}
+    missing = []
+    for full_address in dict.fromkeys(addresses):
+        city = address_cache.get(full_address)
+        if city is MISSING:
+            missing.append(full_address)
+        else:
+            cities[full_address] = city
+
+    if missing:
+        cached = await load_cached_addresses(missing, session)
+        for full_address, city in cached.items():
+            logger.info(f"Найден кэшированный результат для адреса: {full_address} -> {city}")
+            address_cache.set(full_address, city)
+        cities.update(cached)
+        missing = [full_address for full_address in missing if full_address not in cached]
+
+    if missing:
+        cleaned = await request_dadata(missing)
+        if cleaned:
+            await save_cleaned_addresses(cleaned, session)
+            for full_address, city in cleaned.items():
+                logger.info(f"Результат сохранен в кэш: {full_address} -> {city}")
+                address_cache.set(full_address, city)
+        cities.update(cleaned)
+
+    return cities
+
+async def clean_address_with_dadata(full_address: str, session: SessionDep) -> str:
+    logger.info(f"Получен исходный адрес: {full_address}")
+
+    cities = await clean_addresses_with_dadata([full_address], session)
+    if full_address not in cities:
+        logger.error(f"Не удалось извлечь город или регион из адреса: {full_address}")
+        raise ValueError(f"Не удалось извлечь город или регион из адреса: {full_address}")
+
+    city = cities[full_address]
+    logger.info(f"Извлечен город: {city} из адреса: {full_address}")
     return city
 
 async def get_pecom_city_code(city_name: str) -> int:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(PECOM_CITIES_URL)
-        response.raise_for_status()
-    
-    data = response.json()
-    for region, cities in data.items():
-        for city_id, city_full_name in cities.items():
-            extracted_city = city_full_name.lower()
-            if extracted_city == city_name.lower():
-                return int(city_id)
-    raise ValueError(f"Код города для {city_name} не найден")
+    return await pecom_towns.get_city_code(city_name)
 
 def extract_periods(aperiods: str, delivery_type: int) -> tuple[int, int]:
     """Извлекает минимальный и максимальный срок доставки из поля aperiods в зависимости от delivery_type."""
@@ -103,53 +155,40 @@ def extract_periods(aperiods: str, delivery_type: int) -> tuple[int, int]:
     # Если не нашли, используем значение по умолчанию из periods_days
     return 5, 5  # Можно доработать, если есть другие источники данных
 
+@single_flight('pecom.tariff')
+async def request_pecom_tariff(params: dict) -> dict:
+    logger.info("Запрос расчета стоимости ПЭК. Параметры: %s", params, extra=PAYLOAD)
+
+    client = get_http_client('pecom_calc')
+    response = await client.get(PECOM_CALC_URL, params=params)
+    response.raise_for_status()
+
+    data = response.json()
+    logger.info("Ответ расчета стоимости ПЭК: %s", data, extra=PAYLOAD)
+    return data
+
 async def calculate_pecom_delivery(
-    from_city_name: str,
-    to_city_name: str,
+    from_city_id: int,
+    to_city_id: int,
     delivery_type: int,
     packages: list[DeliveryPackage],
-    session: SessionDep,
 ) -> list[dict]:
     if not packages:
         raise ValueError("Нет данных о посылке")
 
-    logger.info(f"Расчет доставки ПЭК из {from_city_name} в {to_city_name}")
-    
-    # Получаем коды городов напрямую из оригинальных названий
-    try:
-        from_city_id = await get_pecom_city_code(from_city_name)
-        to_city_id = await get_pecom_city_code(to_city_name)
-        logger.info(f"Получены коды городов: {from_city_name} -> {from_city_id}, {to_city_name} -> {to_city_id}")
-    except ValueError as e:
-        logger.error(f"Ошибка при получении кодов городов: {str(e)}")
-        raise
-
-    package = packages[0]
-
-    places = [
-        package.width / 100,
-        package.length / 100,
-        package.height / 100,
-        (package.width / 100) * (package.length / 100) * (package.height / 100),
-        package.weight / 1000,
-        0,
-        0,
-    ]
+    logger.info(f"Расчет доставки ПЭК из города {from_city_id} в город {to_city_id}")
+
+    cargo = summarize_packages(packages)
 
     params = {
-        "places[0][]": places,
         "take[town]": from_city_id,
         "deliver[town]": to_city_id,
     }
+    # Каждое место передается своим массивом places[i][]: ширина, длина, высота (м), объем (м³), вес (кг)
+    for i, place in enumerate(cargo.places):
+        params[f"places[{i}][]"] = [place.width, place.length, place.height, place.volume, place.weight, 0, 0]
 
-    logger.info(f"Запрос расчета стоимости ПЭК. Параметры: {params}")
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(PECOM_CALC_URL, params=params)
-        response.raise_for_status()
-
-    data = response.json()
-    logger.info(f"Ответ расчета стоимости ПЭК: {data}")
+    data = await request_pecom_tariff(params)
 
     # Базовая стоимость в зависимости от delivery_type
     base_price = 0.0
@@ -200,5 +239,5 @@ async def calculate_pecom_delivery(
         logger.error("Не удалось получить данные о стоимости доставки от ПЭК")
         raise ValueError("Не удалось получить данные о стоимости доставки от ПЭК")
 
-    logger.info(f"Успешно получены результаты расчета ПЭК: {results}")
+    logger.info("Успешно получены результаты расчета ПЭК: %s", results, extra=PAYLOAD)
     return results
\ No newline at end of file
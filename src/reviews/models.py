@@ -2,13 +2,34 @@ from datetime import date
 from typing import Optional
 
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import BigInteger, String, SmallInteger, ForeignKey
+from sqlalchemy import BigInteger, String, SmallInteger, ForeignKey, Index, text
 
 from src.database import Base
 
 
 class ReviewModel(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        # Постраничная выдача основных отзывов по (created_at, id), см. src/reviews/pagination.py
+        Index(
+            'ix_reviews_top_level_created_at_id',
+            text('created_at DESC'), text('id DESC'),
+            postgresql_where=text('parent_id IS NULL'),
+        ),
+        Index(
+            'ix_reviews_top_level_user_id_created_at_id',
+            'user_id', text('created_at DESC'), text('id DESC'),
+            postgresql_where=text('parent_id IS NULL'),
+        ),
+        # Первые ответы на отзыв (LATERAL в src/reviews/queries.py)
+        Index(
+            'ix_reviews_replies_parent_id_created_at_id',
+            'parent_id', 'created_at', 'id',
+            postgresql_where=text('parent_id IS NOT NULL'),
+        ),
+        # Внешний ключ на users: проверка при удалении пользователя и выборки по автору
+        Index('ix_reviews_user_id', 'user_id'),
+    )
 
     id: Mapped[int] = mapped_column(
         BigInteger,
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import date
+from typing import Optional, Protocol, Sequence, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+
+from src.reviews.models import ReviewModel
+
+
+class ReviewPosition(Protocol):
+    id: int
+    created_at: date
+
+T = TypeVar('T', bound=ReviewPosition)
+
+BIGINT_MIN = -2 ** 63
+BIGINT_MAX = 2 ** 63 - 1
+
+
+def encode_cursor(review: ReviewPosition) -> str:
+    """Непрозрачный курсор: позиция отзыва в порядке (created_at, id) по убыванию."""
+    raw = json.dumps([review.created_at.isoformat(), review.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, review_id = json.loads(raw)
+        created_at, review_id = date.fromisoformat(created_at), int(review_id)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный курсор') from e
+
+    # id вне диапазона BIGINT не может быть позицией отзыва, а asyncpg не смог бы передать его в запрос
+    if not BIGINT_MIN <= review_id <= BIGINT_MAX:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный курсор')
+    return created_at, review_id
+
+def paginate_reviews(query: Select, cursor: Optional[str], limit: int) -> Select:
+    """Страница отзывов после курсора: новые первыми, id разделяет отзывы за один день.
+
+    Запрашивается limit + 1 строка, чтобы узнать, есть ли следующая страница.
+    """
+    if cursor is not None:
+        created_at, review_id = decode_cursor(cursor)
+        query = query.where(tuple_(ReviewModel.created_at, ReviewModel.id) < (created_at, review_id))
+
+    return query.order_by(ReviewModel.created_at.desc(), ReviewModel.id.desc()).limit(limit + 1)
+
+def split_page(reviews: Sequence[T], limit: int) -> tuple[list[T], Optional[str]]:
+    if len(reviews) <= limit:
+        return list(reviews), None
+    page = reviews[:limit]
+    return page, encode_cursor(page[-1])
@@ -0,0 +1,111 @@
+from typing import Optional
+
+from sqlalchemy import ColumnElement, Select, select, true
+from sqlalchemy.orm import aliased
+
+from src.database import SessionDep
+from src.users.models import UserModel
+from src.reviews.models import ReviewModel
+from src.reviews.schemas import ReviewResponseSchema, ReviewWithRepliesSchema, ReviewPageSchema
+from src.reviews.pagination import paginate_reviews, split_page
+
+
+# Сколько первых ответов показывается под каждым отзывом
+REPLIES_PER_REVIEW = 3
+UNKNOWN_USERNAME = 'Неизвестно'
+
+
+def review_tree_query(filters: list[ColumnElement], cursor: Optional[str], limit: int) -> Select:
+    """Страница основных отзывов с первыми REPLIES_PER_REVIEW ответами и именами авторов одним запросом.
+
+    Ответы выбираются LATERAL-подзапросом с LIMIT для каждого отзыва, поэтому у популярных
+    отзывов читаются только первые ответы, а не все. Строка результата — пара (отзыв, ответ),
+    у отзыва без ответов поля ответа равны NULL.
+    """
+    page = paginate_reviews(
+        select(
+            ReviewModel.id,
+            ReviewModel.user_id,
+            ReviewModel.review,
+            ReviewModel.rate,
+            ReviewModel.created_at,
+        ).where(ReviewModel.parent_id.is_(None), *filters),
+        cursor,
+        limit,
+    ).cte('page')
+
+    reply_source = aliased(ReviewModel, name='reply_source')
+    replies = (
+        select(
+            reply_source.id,
+            reply_source.user_id,
+            reply_source.review,
+            reply_source.rate,
+            reply_source.created_at,
+        )
+        .where(reply_source.parent_id == page.c.id)
+        .order_by(reply_source.created_at, reply_source.id)
+        .limit(REPLIES_PER_REVIEW)
+        .lateral('reply')
+    )
+
+    author = aliased(UserModel, name='author')
+    reply_author = aliased(UserModel, name='reply_author')
+
+    return (
+        select(
+            page.c.id,
+            page.c.user_id,
+            page.c.review,
+            page.c.rate,
+            page.c.created_at,
+            author.username,
+            replies.c.id.label('reply_id'),
+            replies.c.user_id.label('reply_user_id'),
+            replies.c.review.label('reply_review'),
+            replies.c.rate.label('reply_rate'),
+            replies.c.created_at.label('reply_created_at'),
+            reply_author.username.label('reply_username'),
+        )
+        .select_from(page)
+        .outerjoin(author, author.id == page.c.user_id)
+        .outerjoin(replies, true())
+        .outerjoin(reply_author, reply_author.id == replies.c.user_id)
+        .order_by(page.c.created_at.desc(), page.c.id.desc(), replies.c.created_at, replies.c.id)
+    )
+
+async def fetch_review_page(
+    session: SessionDep,
+    filters: list[ColumnElement],
+    cursor: Optional[str],
+    limit: int,
+) -> ReviewPageSchema:
+    result = await session.execute(review_tree_query(filters, cursor, limit))
+
+    reviews: list[ReviewWithRepliesSchema] = []
+    for row in result:
+        # Строки одного отзыва идут подряд
+        if not reviews or reviews[-1].id != row.id:
+            reviews.append(ReviewWithRepliesSchema(
+                id=row.id,
+                user_id=row.user_id,
+                username=row.username or UNKNOWN_USERNAME,
+                review=row.review,
+                rate=row.rate,
+                created_at=row.created_at,
+                parent_id=None,
+            ))
+
+        if row.reply_id is not None:
+            reviews[-1].replies.append(ReviewResponseSchema(
+                id=row.reply_id,
+                user_id=row.reply_user_id,
+                username=row.reply_username or UNKNOWN_USERNAME,
+                review=row.reply_review,
+                rate=row.reply_rate,
+                created_at=row.reply_created_at,
+                parent_id=row.id,
+            ))
+
+    page, next_cursor = split_page(reviews, limit)
+    return ReviewPageSchema(reviews=page, next_cursor=next_cursor)
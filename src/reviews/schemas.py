@@ -19,4 +19,9 @@ class ReviewResponseSchema(BaseModel):
 
 
 class ReviewWithRepliesSchema(ReviewResponseSchema):
-    replies: List[ReviewResponseSchema] = []
\ No newline at end of file
+    replies: List[ReviewResponseSchema] = []
+
+class ReviewPageSchema(BaseModel):
+    reviews: List[ReviewWithRepliesSchema]
+    # Курсор следующей страницы; None — страница последняя
+    next_cursor: Optional[str] = None
\ No newline at end of file
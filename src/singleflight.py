@@ -0,0 +1,55 @@
+import asyncio
+import functools
+import json
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+from src.metrics import metrics
+
+
+T = TypeVar('T')
+
+
+def canonical_key(*args, **kwargs) -> str:
+    return json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые вызовы: пока вызов с ключом выполняется,
+    остальные вызывающие получают его результат вместо повторного запроса к службе."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is not None:
+            metrics.increment(f'singleflight.{self.name}.coalesced')
+            return await asyncio.shield(call)
+
+        metrics.increment(f'singleflight.{self.name}.calls')
+        call = asyncio.ensure_future(func())
+        self._calls[key] = call
+        call.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Отмена одного из ожидающих не должна отменять общий вызов
+        return await asyncio.shield(call)
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """Декоратор для корутин-запросов к внешним службам, см. SingleFlight.
+
+    key строит ключ из аргументов вызова; по умолчанию — канонический JSON всех аргументов.
+    """
+    make_key = key or canonical_key
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        group = SingleFlight(name)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            return await group.do(make_key(*args, **kwargs), lambda: func(*args, **kwargs))
+
+        wrapper.single_flight = group
+        return wrapper
+
+    return decorator
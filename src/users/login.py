@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, status
 from sqlalchemy import select
 from src.database import SessionDep
 from src.users.schemas import UserLoginSchema
-from src.users.utils import pwd_context, generate_api_key
+from src.users.utils import generate_api_key
+from src.users.passwords import password_service
 from src.users.models import UserModel
 from src.logger import setup_logger
 
@@ -20,16 +21,27 @@ async def login(session: SessionDep, user_data: UserLoginSchema):
         )
     )
 
-    if not user or not pwd_context.verify(user_data.password, user.password):
+    is_valid, new_password_hash = False, None
+    if user:
+        is_valid, new_password_hash = await password_service.verify_and_update(user_data.password, user.password)
+
+    if not is_valid:
         logger.warning(f"Неудачная попытка входа для пользователя: {user_data.login}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Неверные учетные данные'
         )
-    
+
+    if new_password_hash is not None:
+        # Хэш посчитан с устаревшей стоимостью bcrypt — сохраняем пересчитанный
+        logger.info(f"Обновление хэша пароля пользователя: {user.username}")
+        user.password = new_password_hash
+
     if not user.api_key:
         logger.info(f"Генерация нового API ключа для пользователя: {user.username}")
         user.api_key = generate_api_key()
+
+    if session.dirty:
         await session.commit()
     
     logger.info(f"Успешный вход пользователя: {user.username}")
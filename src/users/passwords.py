@@ -0,0 +1,67 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from passlib.context import CryptContext
+
+from src.metrics import metrics
+
+
+T = TypeVar('T')
+
+# Стоимость bcrypt для новых хэшей; хэши с другой стоимостью пересчитываются при входе
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))
+# Потоки для bcrypt: библиотека отпускает GIL, поэтому хэши считаются параллельно
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# Сколько операций может ждать или выполняться одновременно; остальные запросы ждут в очереди
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', 32))
+
+
+class PasswordService:
+    """Хэширование и проверка паролей bcrypt в отдельном пуле потоков.
+
+    Каждая операция занимает 100–300 мс процессора; в цикле событий она
+    останавливала бы обработку всех остальных запросов.
+    """
+
+    def __init__(self, rounds: int, workers: int, concurrency: int):
+        self.context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=rounds)
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(self, name: str, func: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='passwords')
+
+        queued = time.perf_counter()
+        async with self._semaphore:
+            started = time.perf_counter()
+            metrics.observe('passwords.queue_wait', started - queued)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            finally:
+                metrics.observe(f'passwords.{name}', time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run('hash', self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run('verify', self.context.verify, password, password_hash)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+        """Проверяет пароль; если хэш посчитан с устаревшими параметрами, возвращает новый хэш."""
+        valid, new_hash = await self._run('verify', self.context.verify_and_update, password, password_hash)
+        if new_hash is not None:
+            metrics.increment('passwords.rehashed')
+        return valid, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_service = PasswordService(PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY)
@@ -7,7 +7,8 @@ from fastapi import HTTPException, status, APIRouter
 from src.users.schemas import UserRegistrationSchema
 from src.database import SessionDep
 from src.users.models import UserModel
-from src.users.utils import hashing_password, generate_api_key
+from src.users.utils import generate_api_key
+from src.users.passwords import password_service
 from src.logger import setup_logger
 
 
@@ -44,7 +45,7 @@ async def register(user_data: UserRegistrationSchema, session: SessionDep):
         email = user_data.email,
         username = user_data.username,
         phone = user_data.phone,
-        password = hashing_password(user_data.password),
+        password = await password_service.hash(user_data.password),
         api_key = generate_api_key(),
         created_at = datetime.now(),
         updated_at = datetime.now()
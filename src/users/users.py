@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from src.users.utils import get_current_user, hashing_password, pwd_context
+from src.users.utils import get_current_user_model, generate_api_key, invalidate_principal
+from src.users.passwords import password_service
 from src.users.models import UserModel
 from src.users.schemas import UpdatePhoneNumberSchema, UpdateNameSchema, UpdateSurnameSchema, UpdatePasswordSchema
 from src.database import SessionDep
@@ -14,7 +15,7 @@ users_router = APIRouter()
 async def editing_phone(
     session: SessionDep,
     request: UpdatePhoneNumberSchema,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: UserModel = Depends(get_current_user_model),
 ):
     logger.info(f"Пользователь {current_user.username} изменяет номер телефона")
     current_user.phone = request.phone
@@ -26,7 +27,7 @@ async def editing_phone(
 async def editing_name(
     session: SessionDep,
     request: UpdateNameSchema,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: UserModel = Depends(get_current_user_model),
 ):
     logger.info(f"Пользователь {current_user.username} изменяет имя")
     current_user.name = request.name
@@ -38,7 +39,7 @@ async def editing_name(
 async def editing_surname(
     session: SessionDep,
     request: UpdateSurnameSchema,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: UserModel = Depends(get_current_user_model),
 ):
     logger.info(f"Пользователь {current_user.username} изменяет фамилию")
     current_user.surname = request.surname
@@ -50,25 +51,44 @@ async def editing_surname(
 async def editing_password(
     session: SessionDep,
     request: UpdatePasswordSchema,
-    current_user: UserModel = Depends(get_current_user)
+    current_user: UserModel = Depends(get_current_user_model)
 ):
     logger.info(f"Пользователь {current_user.username} пытается изменить пароль")
-    if not pwd_context.verify(request.old_password, current_user.password):
+    if not await password_service.verify(request.old_password, current_user.password):
         logger.warning(f"Неверный текущий пароль для пользователя {current_user.username}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Введен неверный текущий пароль.'
         )
 
-    if pwd_context.verify(request.new_password, current_user.password):
+    # Старый пароль уже проверен, второй проверки bcrypt не нужно
+    if request.new_password == request.old_password:
         logger.warning(f"Новый пароль совпадает со старым для пользователя {current_user.username}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Пароли должны отличаться.'
         )
     
-    new_password = hashing_password(request.new_password)
+    new_password = await password_service.hash(request.new_password)
     current_user.password = new_password
     await session.commit()
+    invalidate_principal(current_user.api_key)
     logger.info(f"Пароль успешно изменен для пользователя {current_user.username}")
     return {'message': 'Пароль успешно изменен.'}
+
+@users_router.post('/api/v1/users/me/api-key', tags=['users_edit'])
+async def rotating_api_key(
+    session: SessionDep,
+    current_user: UserModel = Depends(get_current_user_model)
+):
+    logger.info(f"Пользователь {current_user.username} обновляет API ключ")
+    old_api_key = current_user.api_key
+    current_user.api_key = generate_api_key()
+    await session.commit()
+    invalidate_principal(old_api_key)
+    logger.info(f"API ключ успешно обновлен для пользователя {current_user.username}")
+    return {
+        'access_token': current_user.api_key,
+        'token_type': 'token',
+        'username': current_user.username
+    }
@@ -1,36 +1,105 @@
-from passlib.context import CryptContext
-from secrets import token_urlsafe
+import hashlib
+import os
+from dataclasses import dataclass
+from secrets import compare_digest, token_urlsafe
+from typing import Optional
 
 from sqlalchemy import select
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from src.users.models import UserModel
+from src.users.models import UserModel, Role
 from src.database import SessionDep
+from src.cache import TTLCache, MISSING
+from src.metrics import metrics
 
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 security_scheme = HTTPBearer(bearerFormat='TOKEN')
 
-def hashing_password(password: str) -> str:
-    return pwd_context.hash(password)
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))
+# Срок жизни записи в секундах: ограничивает устаревание в других процессах,
+# где инвалидация текущего процесса не видна
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Неизменяемый снимок аутентифицированного пользователя, хранится в кэше вместо ORM-объекта."""
+
+    id: int
+    username: str
+    email: str
+    role: Role
+
+    @classmethod
+    def from_model(cls, user: UserModel) -> 'CurrentUser':
+        return cls(id=user.id, username=user.username, email=user.email, role=user.role)
+
+
+# Ключ — SHA-256 от API-ключа, сами ключи в памяти не хранятся
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
 
 def generate_api_key() -> str:
     return token_urlsafe(32)
 
-async def get_current_user(session: SessionDep, credentials: HTTPAuthorizationCredentials = Depends(security_scheme)) -> UserModel:
+def api_key_digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+def invalidate_principal(api_key: Optional[str]) -> None:
+    """Удаляет пользователя из кэша аутентификации: вызывается при смене API-ключа или пароля."""
+    if api_key:
+        principal_cache.pop(api_key_digest(api_key))
+
+def raise_unauthorized():
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail='Неверный токен авторизации',
+        headers={'WWW-Authenticate': 'TOKEN'}
+    )
+
+async def get_current_user(session: SessionDep, credentials: HTTPAuthorizationCredentials = Depends(security_scheme)) -> CurrentUser:
     token = credentials.credentials
+    key = api_key_digest(token)
+
+    principal = principal_cache.get(key)
+    if principal is not MISSING:
+        metrics.increment('auth_cache.hits')
+        return principal
+
+    metrics.increment('auth_cache.misses')
     user = await session.scalar(
         select(UserModel)
         .where(UserModel.api_key == token)
     )
-    
+
     if not user:
+        raise_unauthorized()
+
+    principal = CurrentUser.from_model(user)
+    principal_cache.set(key, principal)
+    return principal
+
+async def get_current_admin(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if current_user.role != Role.ADMIN:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Неверный токен авторизации',
-            headers={'WWW-Authenticate': 'TOKEN'}
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Недостаточно прав'
         )
-    
-    return user
\ No newline at end of file
+    return current_user
+
+async def get_current_user_model(
+    session: SessionDep,
+    current_user: CurrentUser = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+) -> UserModel:
+    """ORM-объект текущего пользователя для обработчиков, которые изменяют его данные.
+
+    Ключ сверяется с базой: кэш аутентификации другого процесса мог еще не узнать
+    о смене ключа, а изменения данных по отозванному ключу недопустимы.
+    """
+    user = await session.get(UserModel, current_user.id)
+    if not user or not user.api_key or not compare_digest(user.api_key, credentials.credentials):
+        invalidate_principal(credentials.credentials)
+        raise_unauthorized()
+    return user